@@ -1,31 +1,72 @@
-import boto3
-import csv
+import contextvars
 import io
-import os
+import itertools
+import json
+import sys
+import tempfile
 import time
-from typing import Dict, Optional, Tuple
-from botocore.exceptions import ClientError
-
-from app.logger import get_logger
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.clients import get_client
+from app.columnar import ColumnarWriter
+from app.config import settings
+from app.csv_engine import CsvStats, aggregate_csv, aggregate_ndjson, log_bad_row_summary
+from app.events import is_custom_event
+from app.idempotency import (
+    Checkpoint,
+    ClaimLostError,
+    build_idempotency_key,
+    checkpoints_enabled,
+    claim_many,
+    claim_once,
+    idempotency_enabled,
+    mark_done,
+    mark_done_many,
+    reclaim_stale,
+    release_claim,
+    save_checkpoint,
+)
+from app.logger import get_logger, log_context
+from app.metrics import MeteredBody, add_metric, current_metrics, metrics_scope, timed
+from app.result_cache import get_result, put_result
+from app.streaming import (
+    iter_chunks,
+    iter_line_blocks,
+    iter_range_chunks,
+    iter_text_lines,
+    open_stream,
+    sniff_compression,
+    sniff_format,
+)
 
 logger = get_logger(__name__)
 
-s3_client = boto3.client("s3")
-dynamodb = boto3.client("dynamodb")
-
-IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "")
+class S3BatchError(Exception):
+    """Raised when records of a batch failed and the trigger can't retry them one by one"""
+    pass
 
 
 def is_s3_event(event: dict) -> bool:
-    return isinstance(event, dict) and "Records" in event
-
-
-def parse_s3_event(event: dict) -> Dict[str, Optional[str]]:
     """
-    Pure function: extracts metadata from the S3 event.
-    No side effects, no AWS calls.
+    Records of S3 notifications, direct or through SQS/SNS. SQS batches of
+    custom events also come as Records: a queue carries one kind of message,
+    so the first record decides.
     """
+    if not isinstance(event, dict) or not event.get("Records"):
+        return False
     record = event["Records"][0]
+    if not isinstance(record, dict) or record.get("eventSource") != "aws:sqs":
+        return True
+    try:
+        message = json.loads(record.get("body") or "")
+    except (ValueError, TypeError):
+        # Malformed bodies keep going to the S3 path, which reports them
+        return True
+    return not is_custom_event(message)
+
+
+def _parse_record(record: dict, item_id: Optional[str] = None, source: str = "aws:s3") -> Dict[str, Optional[str]]:
     s3_obj = record["s3"]["object"]
 
     bucket = record["s3"]["bucket"]["name"]
@@ -34,128 +75,641 @@ def parse_s3_event(event: dict) -> Dict[str, Optional[str]]:
     sequencer = s3_obj.get("sequencer")
 
     logger.info(
-        f"Parsed S3 event | bucket={bucket} key={key} etag={etag} sequencer={sequencer}"
+        "Parsed S3 event | bucket=%s key=%s etag=%s sequencer=%s", bucket, key, etag, sequencer
     )
 
-    return {"bucket": bucket, "key": key, "etag": etag, "sequencer": sequencer}
+    return {
+        "bucket": bucket,
+        "key": key,
+        "etag": etag,
+        "sequencer": sequencer,
+        "item_id": item_id or f"{bucket}/{key}",
+        "source": source,
+    }
 
 
-def build_idempotency_key(bucket: str, key: str, etag: str | None, sequencer: str | None) -> str:
-    # Preferimos eTag si existe (cambia cuando cambia el contenido)
-    uniq = etag or sequencer or "unknown"
-    return f"{bucket}#{key}#{uniq}"
+def _unwrap_notification(body: str) -> List[dict]:
+    """
+    SQS/SNS fan-in: the message body is the original S3 notification,
+    optionally wrapped in an SNS envelope (SNS -> SQS subscriptions).
+    """
+    message = json.loads(body)
+    if isinstance(message, dict) and message.get("Type") == "Notification" and "Message" in message:
+        message = json.loads(message["Message"])
+    if not isinstance(message, dict):
+        return []
+    # s3:TestEvent and similar messages carry no Records
+    return message.get("Records", [])
+
+
+def _message_source(record: dict) -> Tuple[Optional[str], str]:
+    """Id of the message carrying the S3 records (None for direct S3) and its source."""
+    if "s3" in record:
+        return None, "aws:s3"
+    if record.get("eventSource") == "aws:sqs":
+        return record.get("messageId"), "aws:sqs"
+    if "Sns" in record:
+        return record["Sns"].get("MessageId"), "aws:sns"
+    return None, "unknown"
+
+
+def _s3_records(record: dict, source: str) -> List[dict]:
+    if source == "aws:s3":
+        return [record]
+    if source == "aws:sqs":
+        return _unwrap_notification(record["body"])
+    if source == "aws:sns":
+        return _unwrap_notification(json.dumps(record["Sns"]))
+    logger.warning("Unsupported record in S3 event | record=%s", record)
+    return []
+
+
+def parse_s3_records(event: dict) -> List[Dict[str, Optional[str]]]:
+    """
+    Pure function: extracts metadata for EVERY record of the event,
+    including S3 notifications delivered through SQS or SNS.
+    Malformed records (or messages) become an info without bucket/key so
+    that process_s3_object skips them as invalid_event; the records after
+    them are still parsed.
+    """
+    infos: List[Dict[str, Optional[str]]] = []
+    for outer in event["Records"]:
+        item_id, source = _message_source(outer) if isinstance(outer, dict) else (None, "unknown")
+        try:
+            records = _s3_records(outer, source)
+        except (ValueError, KeyError, TypeError):
+            logger.exception("Malformed S3 notification envelope | item_id=%s", item_id)
+            infos.append({"bucket": None, "key": None, "item_id": item_id, "source": source})
+            continue
 
-def claim_once(pk: str, ttl_seconds: int = 3600) -> bool:
+        for record in records:
+            try:
+                infos.append(_parse_record(record, item_id=item_id, source=source))
+            except (KeyError, TypeError):
+                logger.exception("Malformed S3 record | record=%s", record)
+                infos.append({"bucket": None, "key": None, "item_id": item_id, "source": source})
+
+    return infos
+
+
+def parse_s3_event(event: dict) -> Dict[str, Optional[str]]:
     """
-    Attempts to claim processing for this pk using a conditional PutItem.
-    True -> claimed (process)
-    False -> already claimed/processed (skip)
+    Pure function: extracts metadata from the S3 event.
+    No side effects, no AWS calls.
     """
-    if not IDEMPOTENCY_TABLE:
-        logger.warning("IDEMPOTENCY_TABLE not set. Running without idempotency.")
-        return True
+    return _parse_record(event["Records"][0])
 
-    now = int(time.time())
-    expires_at = now + ttl_seconds
 
-    try:
-        dynamodb.put_item(
-            TableName=IDEMPOTENCY_TABLE,
-            Item={
-                "pk": {"S": pk},
-                "status": {"S": "PROCESSING"},
-                "created_at": {"N": str(now)},
-                "expires_at": {"N": str(expires_at)},
-            },
-            ConditionExpression="attribute_not_exists(pk)",
-        )
-        logger.info(f"Idempotency claim succeeded | pk={pk}")
-        return True
+def sum_csv_amount(content: str) -> Tuple[int, int]:
+    return sum_csv_lines(io.StringIO(content))
 
-    except ClientError as e:
-        code = e.response["Error"]["Code"]
-        if code == "ConditionalCheckFailedException":
-            logger.warning(f"Idempotency claim failed (duplicate) | pk={pk}")
-            return False
 
-        logger.exception(f"Idempotency claim error | pk={pk} code={code}")
-        raise
+def _record_decode(seconds: float) -> None:
+    add_metric("DecodeTime", seconds * 1000, "Milliseconds")
 
-def mark_done(pk: str) -> None:
-    if not IDEMPOTENCY_TABLE:
-        return
 
-    dynamodb.update_item(
-        TableName=IDEMPOTENCY_TABLE,
-        Key={"pk": {"S": pk}},
-        UpdateExpression="SET #s = :done",
-        ExpressionAttributeNames={"#s": "status"},
-        ExpressionAttributeValues={":done": {"S": "DONE"}},
-    )
-    logger.info(f"Marked DONE | pk={pk}")
+def _aggregate_stream(
+    body,
+    chunk_size: Optional[int] = None,
+    sink: Optional[ColumnarWriter] = None,
+    key: str = "",
+    content_encoding: Optional[str] = None,
+) -> CsvStats:
+    chunk_size = chunk_size or settings.S3_CHUNK_SIZE
+    chunks, compression, fmt = open_stream(iter_chunks(body, chunk_size), key, content_encoding, chunk_size)
+    return _aggregate_decoded(chunks, compression, fmt, sink)
 
 
-def sum_csv_amount(content: str) -> Tuple[int, int]:
-    reader = csv.DictReader(io.StringIO(content))
+def _aggregate_decoded(
+    chunks: Iterator[bytes], compression: Optional[str], fmt: str, sink: Optional[ColumnarWriter] = None
+) -> CsvStats:
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.set_property("InputFormat", fmt)
+        metrics.set_property("Compression", compression or "none")
 
-    total = 0
-    rows = 0
+    lines = iter_text_lines(chunks, on_decode=_record_decode)
+    if fmt == "ndjson":
+        return aggregate_ndjson(lines, sink=sink)
+    return aggregate_csv(lines, sink=sink)
 
-    for row in reader:
-        # row can contain None keys if the CSV is malformed
-        rows += 1
 
-        # Normalize headers: " Amount " -> "amount"
-        row_norm = {k.strip().lower(): v for k, v in row.items() if k}
+def sum_csv_stream(body, chunk_size: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Streaming variant: reads the S3 StreamingBody in chunks and feeds the
+    CSV reader line by line, so peak memory doesn't depend on object size.
+    gzip/zstd bodies are inflated on the fly and NDJSON is detected from
+    its first bytes (same (total, rows) contract).
+    """
+    return _aggregate_stream(body, chunk_size).as_tuple()
 
-        amount_str = row_norm.get("amount")
-        if amount_str is None:
-            logger.warning(f"Missing 'amount' column | row={row}")
-            continue
 
+def sum_csv_lines(lines: Iterable[str]) -> Tuple[int, int]:
+    return aggregate_csv(lines).as_tuple()
+
+
+# Bytes fetched past the end of a range for its last line, and the size of
+# each follow-up GET when that line is even longer (also the header window)
+RANGE_SLACK_BYTES = 64 * 1024
+
+
+def _iter_window_chunks(bucket: str, key: str, first: int, last: int, size: int) -> Iterator[bytes]:
+    """
+    Chunks of bytes [first, size) of the object, fetched with bounded ranged
+    GetObject calls: [first, last] first, then windows of RANGE_SLACK_BYTES,
+    each one requested only when the consumer reads past the previous one.
+    """
+    while first < size:
+        last = min(last, size - 1)
+        with timed("S3GetObjectLatency"):
+            response = get_client("s3").get_object(Bucket=bucket, Key=key, Range=f"bytes={first}-{last}")
+        body = MeteredBody(response["Body"])
         try:
-            total += int(str(amount_str).strip())
-        except ValueError:
-            logger.warning(f"Invalid amount value | amount={amount_str} row={row}")
-            continue
+            yield from iter_chunks(body, settings.S3_CHUNK_SIZE)
+        finally:
+            body.close()
+        first, last = last + 1, last + RANGE_SLACK_BYTES
 
-    return total, rows
 
+def _read_header(bucket: str, key: str, size: int) -> Optional[Tuple[str, int]]:
+    """
+    Returns the CSV header line and the byte offset where data rows start,
+    or None when the object isn't plain CSV (compressed, NDJSON).
+    """
+    chunks = _iter_window_chunks(bucket, key, 0, RANGE_SLACK_BYTES - 1, size)
+    head = b""
+    try:
+        for chunk in chunks:
+            if not head and (sniff_compression(chunk) or sniff_format(chunk) != "csv"):
+                return None
+            head += chunk
+            nl = head.find(b"\n")
+            if nl != -1:
+                return head[:nl + 1].decode("utf-8"), nl + 1
+    finally:
+        chunks.close()
+    # Header only, no data rows
+    return head.decode("utf-8"), len(head)
+
+
+def _sum_csv_range(bucket: str, key: str, header: str, start: int, end: int, size: int) -> CsvStats:
+    # From start-1: the newline alignment needs the previous byte. The last
+    # owned line may run past `end`: RANGE_SLACK_BYTES more are requested,
+    # and another window only if the line doesn't end within them.
+    chunks = _iter_window_chunks(bucket, key, start - 1, end - 1 + RANGE_SLACK_BYTES, size)
+    try:
+        lines = iter_text_lines(iter_range_chunks(chunks, start, end), on_decode=_record_decode)
+        return aggregate_csv(itertools.chain([header], lines), summarize=False)
+    finally:
+        chunks.close()
+
+
+def sum_csv_ranges(bucket: str, key: str, size: int, parts: int) -> Tuple[int, int]:
+    """
+    Splits the object into `parts` byte ranges fetched with ranged GetObject
+    calls and aggregated in parallel (one connection each), then merges the
+    partial (total, rows). Each range is aligned to the next newline, so
+    quoted fields must not contain newlines.
+    """
+    stats = _aggregate_ranges(bucket, key, size, parts)
+    if stats is None:
+        raise ValueError(f"s3://{bucket}/{key} is not a plain CSV object: byte ranges don't apply")
+    return stats.as_tuple()
+
+
+def _aggregate_ranges(bucket: str, key: str, size: int, parts: int) -> Optional[CsvStats]:
+    """None when the object isn't plain CSV: offsets of a compressed stream can't be split."""
+    header_info = _read_header(bucket, key, size)
+    if header_info is None:
+        return None
+    header, data_start = header_info
+    if data_start >= size:
+        return CsvStats()
+
+    span = -(-(size - data_start) // parts)
+    bounds = [
+        (start, min(start + span, size))
+        for start in range(data_start, size, span)
+    ]
+
+    logger.info(
+        "Reading S3 object by ranges | bucket=%s key=%s size=%s ranges=%s", bucket, key, size, len(bounds)
+    )
+
+    stats = CsvStats()
+    with ThreadPoolExecutor(max_workers=len(bounds)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _sum_csv_range, bucket, key, header, start, end, size)
+            for start, end in bounds
+        ]
+        for future in futures:
+            stats.merge(future.result())
 
+    log_bad_row_summary(stats)
+    return stats
 
-def process_s3_object(info: Dict[str, Optional[str]]) -> Dict[str, object]:
+
+class _Segments:
+    """
+    Cuts a stream of line blocks into segments that end at a block boundary
+    every CHECKPOINT_BYTES or CHECKPOINT_SECONDS; `offset` is where the
+    current segment stopped.
+
+    A block boundary inside a quoted field (an odd number of b'"' so far:
+    escaped quotes come in pairs) is not a record boundary, so the cut waits
+    for the next block that closes the field. Segments start at offset 0 or
+    at an earlier cut, both outside quotes.
+    """
+
+    def __init__(self, blocks: Iterator[Tuple[bytes, int]], offset: int) -> None:
+        self.blocks = blocks
+        self.offset = offset
+        self.done = False
+        self.in_quotes = False
+
+    def next_segment(self) -> Iterator[bytes]:
+        start, started = self.offset, time.monotonic()
+        for block, end in self.blocks:
+            self.offset = end
+            if block.count(b'"') % 2:
+                self.in_quotes = not self.in_quotes
+            yield block
+            if self.in_quotes:
+                continue
+            if end - start >= settings.CHECKPOINT_BYTES or time.monotonic() - started >= settings.CHECKPOINT_SECONDS:
+                return
+        self.done = True
+
+
+def _get_from_checkpoint(bucket: str, key: str, offset: int, etag: Optional[str]) -> Optional[dict]:
+    """Ranged GetObject resuming at `offset`; None when the object is no longer version `etag`."""
+    from botocore.exceptions import ClientError
+
+    # Without it, the bytes of a newer version would be added to the partial totals of the old one
+    conditions = {"IfMatch": etag} if etag else {}
+    try:
+        with timed("S3GetObjectLatency"):
+            # From offset-1 (the b"\n" ending the checkpointed line): always a valid range
+            return get_client("s3").get_object(Bucket=bucket, Key=key, Range=f"bytes={offset - 1}-", **conditions)
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "PreconditionFailed":
+            raise
+        return None
+
+
+def _aggregate_checkpointed(
+    bucket: str, key: str, pk: str, checkpoint: Checkpoint, etag: Optional[str] = None
+) -> CsvStats:
+    """
+    Streaming aggregation that saves its progress on the idempotency record
+    between segments. A resumed checkpoint continues with a ranged GetObject
+    from its offset, the saved header chained in front of the remaining lines,
+    as long as the object is still version `etag`; otherwise it starts over.
+    Checkpoints are only taken between records, never inside a quoted field.
+    """
+    offset = checkpoint.offset
+    response = None
+    if offset:
+        response = _get_from_checkpoint(bucket, key, offset, etag)
+        if response is None:
+            logger.warning("Object changed since its checkpoint, restarting | offset=%s etag=%s", offset, etag)
+            add_metric("StaleCheckpoints", 1)
+            checkpoint = Checkpoint(attempt=checkpoint.attempt)
+            offset = 0
+    if response is None:
+        with timed("S3GetObjectLatency"):
+            response = get_client("s3").get_object(Bucket=bucket, Key=key)
+    body = MeteredBody(response["Body"])
+
+    stats = checkpoint.stats
+    header = checkpoint.header
+    try:
+        chunks = iter_chunks(body, settings.S3_CHUNK_SIZE)
+        if offset:
+            chunks = iter_range_chunks(chunks, offset, sys.maxsize)
+        else:
+            chunks, compression, fmt = open_stream(
+                chunks, key, response.get("ContentEncoding"), settings.S3_CHUNK_SIZE
+            )
+            if compression or fmt != "csv":
+                # Offsets of a compressed stream aren't line boundaries of the
+                # data, and NDJSON has no header: no checkpoints for those
+                return _aggregate_decoded(chunks, compression, fmt)
+        segments = _Segments(iter_line_blocks(chunks, offset), offset)
+
+        while not segments.done:
+            lines = iter_text_lines(segments.next_segment(), on_decode=_record_decode)
+            if header is None:
+                header = next(lines, None)
+                if header is None:
+                    break
+            aggregate_csv(itertools.chain([header], lines), stats=stats, summarize=False)
+
+            if not segments.done:
+                checkpoint.offset = segments.offset
+                checkpoint.header = header
+                save_checkpoint(pk, checkpoint)
+                add_metric("Checkpoints", 1)
+    finally:
+        body.close()
+
+    log_bad_row_summary(stats)
+    return stats
+
+
+def _aggregate_s3_object(
+    bucket: str,
+    key: str,
+    range_parts: Optional[int],
+    sink: Optional[ColumnarWriter] = None,
+    pk: Optional[str] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    etag: Optional[str] = None,
+) -> CsvStats:
+    # Checkpoints only cover the plain streaming path: the columnar output
+    # would be lost with the invocation, and byte ranges run in parallel
+    checkpointed = pk is not None and sink is None and settings.S3_STREAMING and checkpoints_enabled()
+    if checkpointed and checkpoint is not None and checkpoint.offset:
+        logger.info("Resuming from checkpoint | offset=%s rows=%s", checkpoint.offset, checkpoint.stats.rows)
+        return _aggregate_checkpointed(bucket, key, pk, checkpoint, etag)
+
+    parts = settings.S3_RANGE_PARTS if range_parts is None else range_parts
+    # The columnar output is written in row order by one writer: no byte ranges
+    if parts > 1 and sink is None:
+        with timed("S3HeadObjectLatency"):
+            head = get_client("s3").head_object(Bucket=bucket, Key=key)
+        plain = sniff_compression(b"", head.get("ContentEncoding"), key) is None and sniff_format(b"", key) == "csv"
+        if head["ContentLength"] >= settings.S3_RANGE_MIN_SIZE and plain:
+            stats = _aggregate_ranges(bucket, key, head["ContentLength"], parts)
+            if stats is not None:
+                return stats
+
+    if checkpointed:
+        return _aggregate_checkpointed(bucket, key, pk, checkpoint or Checkpoint())
+
+    with timed("S3GetObjectLatency"):
+        response = get_client("s3").get_object(Bucket=bucket, Key=key)
+    body = MeteredBody(response["Body"])
+    content_encoding = response.get("ContentEncoding")
+    if settings.S3_STREAMING:
+        return _aggregate_stream(body, sink=sink, key=key, content_encoding=content_encoding)
+
+    raw = body.read()
+    if sniff_compression(raw[:4], content_encoding, key) or sniff_format(raw[:64], key) != "csv":
+        # Buffered mode still inflates/parses these as a stream
+        return _aggregate_stream(io.BytesIO(raw), sink=sink, key=key, content_encoding=content_encoding)
+    with timed("DecodeTime"):
+        content = raw.decode("utf-8")
+    return aggregate_csv(io.StringIO(content), sink=sink)
+
+
+def process_s3_object(
+    info: Dict[str, Optional[str]],
+    range_parts: Optional[int] = None,
+    claimed: Optional[bool] = None,
+    defer_done: bool = False,
+) -> Dict[str, object]:
+    """
+    claimed: result of an earlier batched claim (claim_many); None -> claim_once here.
+    defer_done: leave the DONE marker to the caller (mark_done_many at the end of a batch).
+    """
     bucket = info["bucket"]
     key = info["key"]
     etag = info.get("etag")
     sequencer = info.get("sequencer")
 
     if not bucket or not key:
-        logger.error(f"Missing bucket/key in S3 info | info={info}")
+        logger.error("Missing bucket/key in S3 info | info=%s", info)
         return {"skipped": True, "reason": "invalid_event"}
 
     pk = build_idempotency_key(bucket=bucket, key=key, etag=etag, sequencer=sequencer)
 
+    # Without idempotency, replays of the same object version are served
+    # from the warm-container result cache (unknown versions are never cached)
+    cacheable = not idempotency_enabled() and bool(etag or sequencer)
+
+    with log_context(pk=pk), metrics_scope(pk=pk, bucket=bucket, key=key):
+        cached = get_result(pk) if cacheable else None
+        if cached is not None:
+            logger.info("Result cache hit | bucket=%s key=%s pk=%s", bucket, key, pk)
+            return {**cached, "cached": True}
+
+        result = _process_object(bucket, key, etag, pk, range_parts, claimed, defer_done)
+        if cacheable and not result["skipped"]:
+            put_result(pk, result)
+        return result
+
+
+def _open_output() -> Optional[ColumnarWriter]:
+    if not settings.OUTPUT_BUCKET:
+        return None
+    # Compressed batches stay in memory up to 16 MB, then spill to /tmp
+    spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    return ColumnarWriter(spool, batch_rows=settings.OUTPUT_BATCH_ROWS, fmt=settings.OUTPUT_FORMAT)
+
+
+def _write_output(
+    writer: ColumnarWriter, bucket: str, key: str, etag: Optional[str], pk: str, stats: CsvStats
+) -> Dict[str, str]:
+    """Uploads the columnar file and a small JSON manifest summarizing the source file."""
+    writer.close()
+    base = f"{settings.OUTPUT_PREFIX}{key}"
+    data_key = f"{base}.{writer.extension}"
+    manifest_key = f"{base}.manifest.json"
+
+    manifest = {
+        "source": {"bucket": bucket, "key": key, "etag": etag, "pk": pk},
+        "output": {"bucket": settings.OUTPUT_BUCKET, "key": data_key, "format": writer.format},
+        "columns": writer.schema(),
+        "rows": stats.rows,
+        "clean_rows": writer.rows,
+        "out_of_range_rows": writer.out_of_range,
+        "batches": writer.batches,
+        "total_amount": stats.total,
+        "missing_amount_rows": stats.missing,
+        "invalid_amount_rows": stats.invalid,
+        "created_at": int(time.time()),
+    }
+
+    s3 = get_client("s3")
+    with timed("OutputWriteLatency"):
+        writer.out.seek(0)
+        s3.put_object(Bucket=settings.OUTPUT_BUCKET, Key=data_key, Body=writer.out)
+        s3.put_object(
+            Bucket=settings.OUTPUT_BUCKET,
+            Key=manifest_key,
+            Body=json.dumps(manifest).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    logger.info("Wrote columnar output | bucket=%s key=%s rows=%s", settings.OUTPUT_BUCKET, data_key, writer.rows)
+    return {"bucket": settings.OUTPUT_BUCKET, "data_key": data_key, "manifest_key": manifest_key}
+
+
+def _process_object(
+    bucket: str,
+    key: str,
+    etag: Optional[str],
+    pk: str,
+    range_parts: Optional[int],
+    claimed: Optional[bool],
+    defer_done: bool,
+) -> Dict[str, object]:
     # Idempotency check BEFORE side effects (reading S3)
-    if not claim_once(pk):
-        logger.info(f"Duplicate S3 event skipped | bucket={bucket} key={key} pk={pk}")
+    checkpoint = None
+    if claimed is None:
+        claimed = claim_once(pk)
+    if not claimed:
+        # A checkpointed claim without heartbeat: its invocation died, resume it
+        checkpoint = reclaim_stale(pk, settings.CHECKPOINT_STALE_SECONDS)
+        if checkpoint is not None:
+            add_metric("ResumedObjects", 1)
+    if not claimed and checkpoint is None:
+        logger.info("Duplicate S3 event skipped | bucket=%s key=%s pk=%s", bucket, key, pk)
+        add_metric("DuplicatesSkipped", 1)
         return {"skipped": True, "reason": "duplicate", "pk": pk}
 
-    logger.info(f"Reading S3 object | bucket={bucket} key={key}")
+    logger.info("Reading S3 object | bucket=%s key=%s", bucket, key)
 
+    writer = _open_output()
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        content = response["Body"].read().decode("utf-8")
+        start = time.perf_counter()
+        try:
+            stats = _aggregate_s3_object(
+                bucket, key, range_parts, sink=writer, pk=pk, checkpoint=checkpoint, etag=etag
+            )
+        except Exception:
+            logger.exception("Failed reading S3 object | bucket=%s key=%s pk=%s", bucket, key, pk)
+            add_metric("FailedObjects", 1)
+            raise
+        _record_aggregate_metrics(stats, time.perf_counter() - start)
+
+        output = _write_output(writer, bucket, key, etag, pk, stats) if writer is not None else None
+
+        if not defer_done:
+            mark_done(pk)
+    except ClaimLostError:
+        # Another invocation owns the claim now: leave it alone
+        raise
     except Exception:
-        logger.exception(f"Failed reading S3 object | bucket={bucket} key={key} pk={pk}")
+        # Otherwise the retry would find the claim and skip the object as a duplicate
+        release_claim(pk, attempt=checkpoint.attempt if checkpoint is not None else 0)
         raise
+    finally:
+        if writer is not None:
+            # Drops the spool (and its /tmp file once it spilled) even on failure
+            writer.out.close()
+
+    total, rows = stats.as_tuple()
+    logger.info("Processed CSV | rows=%s total_amount=%s | pk=%s", rows, total, pk)
+    result: Dict[str, object] = {"skipped": False, "rows": rows, "total_amount": total, "bad_rows": stats.bad_rows, "pk": pk}
+    if output is not None:
+        result["output"] = output
+    return result
+
+
+def _record_aggregate_metrics(stats: CsvStats, seconds: float) -> None:
+    metrics = current_metrics()
+    if metrics is None:
+        return
+
+    metrics.add("AggregateTime", seconds * 1000, "Milliseconds")
+    # What's left once S3 reads and decoding are taken out is CSV parsing.
+    # (With byte ranges, reads/decoding overlap across threads.)
+    waited = metrics.values.get("S3ReadTime", 0) + metrics.values.get("DecodeTime", 0)
+    metrics.add("CsvParseTime", max(0.0, seconds * 1000 - waited), "Milliseconds")
+    metrics.add("RowsProcessed", stats.rows)
+    metrics.add("BadRows", stats.bad_rows)
+    metrics.add("MissingAmountRows", stats.missing)
+    metrics.add("InvalidAmountRows", stats.invalid)
+    if seconds > 0:
+        metrics.add("RowsPerSecond", stats.rows / seconds, "Count/Second")
+
+
+def _pk_for(info: Dict[str, Optional[str]]) -> Optional[str]:
+    if not info.get("bucket") or not info.get("key"):
+        return None
+    return build_idempotency_key(
+        bucket=info["bucket"], key=info["key"], etag=info.get("etag"), sequencer=info.get("sequencer")
+    )
 
-    total, rows = sum_csv_amount(content)
 
-    mark_done(pk)
+def process_s3_batch(infos: List[Dict[str, Optional[str]]], max_workers: Optional[int] = None) -> Dict[str, object]:
+    """
+    Runs claim/get/aggregate for every record on a bounded thread pool
+    (the work is I/O-bound on boto3, whose clients are thread-safe).
+    A failing record doesn't abort the others: it is reported in
+    batchItemFailures so only that item gets retried.
+
+    Claims are batched up front (claim_many) and the DONE markers are
+    written in one batch at the end (mark_done_many).
+    """
+    if not infos:
+        return {"results": [], "batchItemFailures": []}
 
-    logger.info(f"Processed CSV | rows={rows} total_amount={total} | pk={pk}")
-    return {"skipped": False, "rows": rows, "total_amount": total, "pk": pk}
+    workers = max(1, min(max_workers or settings.S3_MAX_WORKERS, len(infos)))
+    # Batch-level EMF line (batched claim/DONE latencies); each record emits its own
+    with metrics_scope(records=len(infos)), timed("BatchDuration"):
+        batch = _process_batch(infos, workers)
+        add_metric("FailedRecords", len(batch["batchItemFailures"]))
+        return batch
 
-    
 
+def _process_batch(infos: List[Dict[str, Optional[str]]], workers: int) -> Dict[str, object]:
+    results: List[Dict[str, object]] = [{} for _ in infos]
+
+    pks = [_pk_for(info) for info in infos]
+    valid = [i for i, pk in enumerate(pks) if pk]
+    # None: claim state unknown, the record claims itself with claim_once
+    claims: List[Optional[bool]] = [None] * len(infos)
+    try:
+        for i, ok in zip(valid, claim_many([pks[i] for i in valid])):
+            claims[i] = ok
+    except Exception:
+        # Nothing was claimed: each record falls back to its own claim_once
+        logger.exception("Batched idempotency claim failed, claiming per record")
 
+    def run(index: int) -> None:
+        info = infos[index]
+        try:
+            results[index] = process_s3_object(info, claimed=claims[index], defer_done=True)
+        except Exception as e:
+            logger.exception("S3 record failed | item_id=%s", info.get("item_id"))
+            results[index] = {"skipped": False, "failed": True, "error": str(e)}
+
+    if workers == 1:
+        for i in range(len(infos)):
+            run(i)
+    else:
+        # Threads don't inherit contextvars: copy the log context into each task
+        contexts = [contextvars.copy_context() for _ in infos]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda i: contexts[i].run(run, i), range(len(infos))))
+
+    done = [r["pk"] for r in results if r.get("pk") and r.get("skipped") is False and not r.get("failed")]
+    try:
+        mark_done_many(done)
+    except Exception as e:
+        logger.exception("Failed marking batch DONE | pks=%s", len(done))
+        for r in results:
+            if r.get("pk") in done:
+                r.update({"failed": True, "error": str(e)})
+        # They will be retried: without their claims they aren't duplicates
+        for pk in done:
+            release_claim(pk)
+
+    failures: List[str] = []
+    for info, result in zip(infos, results):
+        item_id = info.get("item_id")
+        result["item_id"] = item_id
+        # Several S3 records can share one SQS message: report it once
+        if result.get("failed") and item_id and item_id not in failures:
+            failures.append(item_id)
+
+    logger.info(
+        "Processed S3 batch | records=%s failed=%s workers=%s", len(infos), len(failures), workers
+    )
+    return {
+        "results": results,
+        "batchItemFailures": [{"itemIdentifier": i} for i in failures],
+    }
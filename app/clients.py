@@ -0,0 +1,47 @@
+import threading
+from typing import Any, Dict
+
+from app.config import settings
+
+# One client per service, shared by all threads and reused across warm invocations
+_clients: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def _build_client(service: str) -> Any:
+    # boto3/botocore are imported here, not at module level: invocations that
+    # never touch AWS (custom events) don't pay for loading them on cold start
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=settings.AWS_TCP_KEEPALIVE,
+        connect_timeout=settings.AWS_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_READ_TIMEOUT,
+        retries={"mode": settings.AWS_RETRY_MODE, "max_attempts": settings.AWS_MAX_ATTEMPTS},
+    )
+    return boto3.client(service, config=config)
+
+
+def get_client(service: str) -> Any:
+    """
+    Returns the boto3 client for `service`, creating it on first use.
+    Thread-safe: boto3's default session must not build clients concurrently.
+    """
+    client = _clients.get(service)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(service)
+        if client is None:
+            client = _build_client(service)
+            _clients[service] = client
+    return client
+
+
+def reset_clients() -> None:
+    """Drops the cached clients (tests, or after changing settings)."""
+    with _lock:
+        _clients.clear()
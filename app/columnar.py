@@ -0,0 +1,214 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+# Fallback format when pyarrow isn't installed: a sequence of zlib-compressed
+# column batches. File = MAGIC, then per batch:
+#   >I length of the batch header, batch header JSON, one blob per column
+# int64 columns: little-endian array('q'); string columns: array('I') of
+# UTF-8 lengths followed by the concatenated UTF-8 bytes.
+MAGIC = b"EDCOL1\n"
+COLUMNAR_EXTENSION = "edcol"
+PARQUET_EXTENSION = "parquet"
+
+DEFAULT_BATCH_ROWS = 65536
+
+INT64_MIN, INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def column_names(header: List[str]) -> List[str]:
+    """Normalized (strip + lower), non-empty and unique column names."""
+    names: List[str] = []
+    for i, raw in enumerate(header):
+        name = raw.strip().lower() or f"column_{i}"
+        if name in names:
+            name = f"{name}_{i}"
+        names.append(name)
+    return names
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class ColumnarWriter:
+    """
+    Row sink for app.csv_engine.aggregate_csv: buffers the cleaned rows
+    (valid amount, typed as int64; other columns as strings) and writes them
+    in compressed columnar batches of `batch_rows` to `out`.
+    Parquet when pyarrow is available, the stdlib EDCOL1 format otherwise.
+    Amounts that don't fit in int64 are left out (counted in `out_of_range`):
+    they still count in the aggregate, which sums Python ints.
+    """
+
+    def __init__(self, out: BinaryIO, batch_rows: int = DEFAULT_BATCH_ROWS, fmt: str = "auto") -> None:
+        if fmt == "auto":
+            fmt = "parquet" if parquet_available() else "columnar"
+        self.format = fmt
+        self.extension = PARQUET_EXTENSION if fmt == "parquet" else COLUMNAR_EXTENSION
+        self.out = out
+        self.batch_rows = batch_rows
+        self.columns: List[str] = []
+        self.amount_index: Optional[int] = None
+        self.rows = 0
+        self.out_of_range = 0
+        self.batches = 0
+        self._buffer: List[list] = []
+        self._amounts = array("q")
+        self._parquet = None
+        self._schema = None
+        self.started = False
+
+    def start(self, header: List[str], amount_index: Optional[int]) -> None:
+        self.started = True
+        self.columns = column_names(header)
+        self.amount_index = amount_index
+        self._buffer = [[] for _ in self.columns]
+        if amount_index is not None:
+            # The amount column is always called "amount"; other columns
+            # normalized to the same name (duplicates) get renamed
+            for i, name in enumerate(self.columns):
+                if name == "amount" and i != amount_index:
+                    self.columns[i] = f"amount_{i}"
+            self.columns[amount_index] = "amount"
+
+        if self.format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self._schema = pa.schema(
+                [(name, pa.int64() if i == amount_index else pa.string()) for i, name in enumerate(self.columns)]
+            )
+            self._parquet = pq.ParquetWriter(self.out, self._schema, compression="zstd")
+        else:
+            self.out.write(MAGIC)
+
+    def add(self, row: List[str], amount: int) -> None:
+        if not INT64_MIN <= amount <= INT64_MAX:
+            self.out_of_range += 1
+            return
+        for i, column in enumerate(self._buffer):
+            if i == self.amount_index:
+                continue
+            column.append(row[i] if i < len(row) else "")
+        self._amounts.append(amount)
+        self.rows += 1
+        if len(self._amounts) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._amounts:
+            return
+
+        if self._parquet is not None:
+            import pyarrow as pa
+
+            data = {
+                name: (list(self._amounts) if i == self.amount_index else self._buffer[i])
+                for i, name in enumerate(self.columns)
+            }
+            self._parquet.write_table(pa.Table.from_pydict(data, schema=self._schema))
+        else:
+            self._write_batch()
+
+        self._buffer = [[] for _ in self.columns]
+        self._amounts = array("q")
+        self.batches += 1
+
+    def _write_batch(self) -> None:
+        blobs = []
+        meta = []
+        for i, name in enumerate(self.columns):
+            if i == self.amount_index:
+                blob = zlib.compress(_le_bytes(self._amounts), 6)
+                meta.append({"name": name, "type": "int64", "length": len(blob)})
+            else:
+                encoded = [value.encode("utf-8") for value in self._buffer[i]]
+                raw = _le_bytes(array("I", map(len, encoded))) + b"".join(encoded)
+                blob = zlib.compress(raw, 6)
+                meta.append({"name": name, "type": "string", "length": len(blob)})
+            blobs.append(blob)
+
+        header = json.dumps({"rows": len(self._amounts), "columns": meta}).encode("utf-8")
+        self.out.write(struct.pack(">I", len(header)))
+        self.out.write(header)
+        for blob in blobs:
+            self.out.write(blob)
+
+    def schema(self) -> List[Dict[str, str]]:
+        return [
+            {"name": name, "type": "int64" if i == self.amount_index else "string"}
+            for i, name in enumerate(self.columns)
+        ]
+
+    def close(self) -> None:
+        if not self.started:
+            # No clean row reached the sink (empty object, every NDJSON line
+            # bad): still a valid file, with no columns and no batches
+            self.start([], None)
+        self._flush()
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def read_columnar(fp: BinaryIO, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one {column: values} dict per batch of an EDCOL1 file.
+    Columns not requested are skipped without decompressing them.
+    """
+    if fp.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not an EDCOL1 columnar file")
+
+    while True:
+        size = fp.read(4)
+        if not size:
+            return
+        header = json.loads(fp.read(struct.unpack(">I", size)[0]))
+        rows = header["rows"]
+        batch: Dict[str, Any] = {}
+
+        for column in header["columns"]:
+            if columns is not None and column["name"] not in columns:
+                fp.seek(column["length"], 1)
+                continue
+            raw = zlib.decompress(fp.read(column["length"]))
+            if column["type"] == "int64":
+                batch[column["name"]] = _from_le_bytes("q", raw)
+            else:
+                split = rows * array("I").itemsize
+                lengths = _from_le_bytes("I", raw[:split])
+                data = raw[split:]
+                values, pos = [], 0
+                for n in lengths:
+                    values.append(data[pos:pos + n].decode("utf-8"))
+                    pos += n
+                batch[column["name"]] = values
+        yield batch
+
+
+def sum_columnar_amount(fp: BinaryIO) -> int:
+    """Re-aggregation straight from the columnar output: only `amount` is read."""
+    return sum(sum(batch["amount"]) for batch in read_columnar(fp, columns=["amount"]))
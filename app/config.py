@@ -4,11 +4,86 @@ class ConfigError(Exception):
     """Raised when configuration is invalid."""
     pass
 
+
+def _int_env(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise ConfigError(f"{name} must be an integer, got '{raw}'")
+
+
+def _bool_env(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    value = raw.strip().lower()
+    if value in {"1", "true", "yes", "on"}:
+        return True
+    if value in {"0", "false", "no", "off"}:
+        return False
+    raise ConfigError(f"{name} must be a boolean, got '{raw}'")
+
+
 class Settings:
     def __init__(self) -> None:
         self.SERVICE_NAME = os.getenv("SERVICE_NAME", "event-driven-service")
         self.ENVIRONMENT = os.getenv("ENVIRONMENT", "dev")
         self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+        # "json" -> structured lines for CloudWatch Logs Insights
+        self.LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+        # Write logs from a background thread (QueueHandler + QueueListener)
+        self.LOG_ASYNC = _bool_env("LOG_ASYNC", False)
+
+        # Max threads used to process the records of one S3 notification batch
+        self.S3_MAX_WORKERS = _int_env("S3_MAX_WORKERS", 8)
+
+        # Stream S3 objects in chunks instead of read().decode() into memory
+        self.S3_STREAMING = _bool_env("S3_STREAMING", True)
+        self.S3_CHUNK_SIZE = _int_env("S3_CHUNK_SIZE", 1024 * 1024)
+
+        # Parallel byte-range reads for big objects (0/1 = single stream)
+        self.S3_RANGE_PARTS = _int_env("S3_RANGE_PARTS", 0)
+        self.S3_RANGE_MIN_SIZE = _int_env("S3_RANGE_MIN_SIZE", 64 * 1024 * 1024)
+
+        # Warm-container cache of pks already marked DONE (0 disables it)
+        self.IDEMPOTENCY_CACHE_SIZE = _int_env("IDEMPOTENCY_CACHE_SIZE", 1024)
+        self.IDEMPOTENCY_CACHE_TTL = _int_env("IDEMPOTENCY_CACHE_TTL", 3600)
+
+        # Warm-container cache of aggregate results per object version, used
+        # when IDEMPOTENCY_TABLE is unset (0 disables it). RESULT_CACHE_DIR
+        # (e.g. /tmp/result-cache) adds a disk tier; empty = memory only.
+        self.RESULT_CACHE_SIZE = _int_env("RESULT_CACHE_SIZE", 256)
+        self.RESULT_CACHE_TTL = _int_env("RESULT_CACHE_TTL", 3600)
+        self.RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+        self.RESULT_CACHE_DISK_SIZE = _int_env("RESULT_CACHE_DISK_SIZE", 10000)
+
+        # Progress checkpoints of big objects on the idempotency record (0 disables
+        # them): saved every CHECKPOINT_BYTES or CHECKPOINT_SECONDS. A PROCESSING
+        # claim with a checkpoint and no heartbeat for CHECKPOINT_STALE_SECONDS is resumed.
+        self.CHECKPOINT_BYTES = _int_env("CHECKPOINT_BYTES", 64 * 1024 * 1024)
+        self.CHECKPOINT_SECONDS = _int_env("CHECKPOINT_SECONDS", 60)
+        self.CHECKPOINT_STALE_SECONDS = _int_env("CHECKPOINT_STALE_SECONDS", 300)
+
+        # Optional columnar output of the cleaned rows + per-file manifest
+        self.OUTPUT_BUCKET = os.getenv("OUTPUT_BUCKET", "")
+        self.OUTPUT_PREFIX = os.getenv("OUTPUT_PREFIX", "processed/")
+        self.OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "auto").lower()
+        self.OUTPUT_BATCH_ROWS = _int_env("OUTPUT_BATCH_ROWS", 65536)
+
+        # CloudWatch Embedded Metric Format lines on stdout (see app/metrics.py)
+        self.METRICS_ENABLED = _bool_env("METRICS_ENABLED", True)
+        self.METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "EventDrivenService")
+
+        # boto3 clients (created lazily on first use, see app/clients.py)
+        self.AWS_MAX_POOL_CONNECTIONS = _int_env("AWS_MAX_POOL_CONNECTIONS", 32)
+        self.AWS_TCP_KEEPALIVE = _bool_env("AWS_TCP_KEEPALIVE", True)
+        self.AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "standard").lower()
+        self.AWS_MAX_ATTEMPTS = _int_env("AWS_MAX_ATTEMPTS", 3)
+        self.AWS_CONNECT_TIMEOUT = _int_env("AWS_CONNECT_TIMEOUT", 5)
+        self.AWS_READ_TIMEOUT = _int_env("AWS_READ_TIMEOUT", 60)
 
         self.validate()
     
@@ -25,5 +100,52 @@ class Settings:
                 f"LOG_LEVEL must be one of {sorted(allowed_levels)}, got '{self.LOG_LEVEL}'"
             )
 
+        allowed_formats = {"text", "json"}
+        if self.LOG_FORMAT not in allowed_formats:
+            raise ConfigError(
+                f"LOG_FORMAT must be one of {sorted(allowed_formats)}, got '{self.LOG_FORMAT}'"
+            )
+
+        if self.S3_MAX_WORKERS < 1:
+            raise ConfigError(
+                f"S3_MAX_WORKERS must be >= 1, got {self.S3_MAX_WORKERS}"
+            )
+
+        if self.S3_CHUNK_SIZE < 1024:
+            raise ConfigError(
+                f"S3_CHUNK_SIZE must be >= 1024 bytes, got {self.S3_CHUNK_SIZE}"
+            )
+
+        if self.S3_RANGE_PARTS < 0:
+            raise ConfigError(
+                f"S3_RANGE_PARTS must be >= 0, got {self.S3_RANGE_PARTS}"
+            )
+
+        if self.RESULT_CACHE_SIZE < 0 or self.RESULT_CACHE_TTL < 1 or self.RESULT_CACHE_DISK_SIZE < 1:
+            raise ConfigError("RESULT_CACHE_SIZE must be >= 0, RESULT_CACHE_TTL and RESULT_CACHE_DISK_SIZE >= 1")
+
+        if self.CHECKPOINT_BYTES < 0 or self.CHECKPOINT_SECONDS < 1:
+            raise ConfigError("CHECKPOINT_BYTES must be >= 0 and CHECKPOINT_SECONDS >= 1")
+
+        if self.CHECKPOINT_STALE_SECONDS <= self.CHECKPOINT_SECONDS:
+            raise ConfigError(
+                f"CHECKPOINT_STALE_SECONDS must be > CHECKPOINT_SECONDS, got {self.CHECKPOINT_STALE_SECONDS}"
+            )
+
+        allowed_output_formats = {"auto", "parquet", "columnar"}
+        if self.OUTPUT_FORMAT not in allowed_output_formats:
+            raise ConfigError(
+                f"OUTPUT_FORMAT must be one of {sorted(allowed_output_formats)}, got '{self.OUTPUT_FORMAT}'"
+            )
+
+        allowed_retry_modes = {"legacy", "standard", "adaptive"}
+        if self.AWS_RETRY_MODE not in allowed_retry_modes:
+            raise ConfigError(
+                f"AWS_RETRY_MODE must be one of {sorted(allowed_retry_modes)}, got '{self.AWS_RETRY_MODE}'"
+            )
+
+        if self.AWS_MAX_POOL_CONNECTIONS < 1 or self.AWS_MAX_ATTEMPTS < 1:
+            raise ConfigError("AWS_MAX_POOL_CONNECTIONS and AWS_MAX_ATTEMPTS must be >= 1")
+
 
 settings = Settings()
@@ -0,0 +1,267 @@
+import csv
+import json
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, List, Optional, Protocol, Tuple
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Amounts are converted in batches: one sum(map(int, ...)) call per batch
+# instead of a try/except + int() per row. Dirty batches fall back to per value.
+BATCH_SIZE = 4096
+
+# Only the first N bad rows of each kind are logged, the rest are summarized
+MAX_ROW_WARNINGS = 5
+
+
+@dataclass
+class CsvStats:
+    total: int = 0
+    rows: int = 0
+    missing: int = 0
+    invalid: int = 0
+
+    @property
+    def bad_rows(self) -> int:
+        return self.missing + self.invalid
+
+    def merge(self, other: "CsvStats") -> "CsvStats":
+        self.total += other.total
+        self.rows += other.rows
+        self.missing += other.missing
+        self.invalid += other.invalid
+        return self
+
+    def as_tuple(self) -> Tuple[int, int]:
+        return self.total, self.rows
+
+
+def find_amount_index(header: List[str]) -> Optional[int]:
+    """
+    Normalizes the header ONCE: " Amount " -> "amount".
+    Same precedence as the old per-row dict normalization: the last
+    matching column wins, empty column names are ignored.
+    """
+    index = None
+    for i, name in enumerate(header):
+        if name and name.strip().lower() == "amount":
+            index = i
+    return index
+
+
+class _BadRowLog:
+    """Rate-limited warnings for malformed rows + a summary with counts"""
+
+    def __init__(self, stats: CsvStats, limit: int = MAX_ROW_WARNINGS, summarize: bool = True) -> None:
+        self.stats = stats
+        self.limit = limit
+        self.summarize = summarize
+
+    def missing(self, row: List[str]) -> None:
+        self.stats.missing += 1
+        if self.stats.missing <= self.limit:
+            logger.warning("Missing 'amount' column | row=%s", row)
+
+    def invalid(self, value: str) -> None:
+        self.stats.invalid += 1
+        if self.stats.invalid <= self.limit:
+            logger.warning("Invalid amount value | amount=%s", value)
+
+    def summary(self) -> None:
+        if self.summarize and self.stats.bad_rows > self.limit:
+            logger.warning(
+                "Skipped bad rows | missing_amount=%s invalid_amount=%s (first %s of each logged)",
+                self.stats.missing,
+                self.stats.invalid,
+                self.limit,
+            )
+
+
+def log_bad_row_summary(stats: CsvStats) -> None:
+    """Summary of an aggregation done in several aggregate_csv(summarize=False) calls."""
+    _BadRowLog(stats).summary()
+
+
+def _sum_amounts(values: List[str], bad: _BadRowLog) -> int:
+    try:
+        # int() already ignores surrounding whitespace, like int(str(v).strip())
+        return sum(map(int, values))
+    except ValueError:
+        pass
+
+    total = 0
+    for value in values:
+        try:
+            total += int(value)
+        except ValueError:
+            bad.invalid(value)
+    return total
+
+
+class RowSink(Protocol):
+    """Receives the cleaned rows (valid amount) while aggregating, e.g. ColumnarWriter."""
+
+    def start(self, header: List[str], amount_index: Optional[int]) -> None: ...
+
+    def add(self, row: List[str], amount: int) -> None: ...
+
+
+def aggregate_csv(
+    lines: Iterable[str],
+    stats: Optional[CsvStats] = None,
+    sink: Optional[RowSink] = None,
+    summarize: bool = True,
+) -> CsvStats:
+    """
+    Sums the `amount` column of CSV lines (the first line is the header).
+
+    Same (total, rows) semantics as csv.DictReader + header normalization:
+    blank lines are not rows, short rows count as missing amount, values
+    that aren't integers count as invalid. Bad rows are counted, never raised.
+    Pass `stats` to continue an aggregation (e.g. another byte range) and
+    `sink` to also receive every clean row with its parsed amount.
+    summarize=False skips the bad rows summary (see log_bad_row_summary).
+    """
+    stats = stats if stats is not None else CsvStats()
+    bad = _BadRowLog(stats, summarize=summarize)
+    reader = csv.reader(lines)
+
+    header = next(reader, None)
+    if header is None:
+        return stats
+
+    index = find_amount_index(header)
+    if sink is not None:
+        sink.start(header, index)
+
+    if index is None:
+        for row in reader:
+            if row:
+                stats.rows += 1
+                bad.missing(row)
+        bad.summary()
+        return stats
+
+    if sink is not None:
+        return _aggregate_rows_into(reader, index, stats, bad, sink)
+
+    rows = 0
+    total = 0
+    pending: List[str] = []
+    append = pending.append
+
+    for row in reader:
+        if not row:
+            continue
+        rows += 1
+        if len(row) > index:
+            append(row[index])
+            if len(pending) >= BATCH_SIZE:
+                total += _sum_amounts(pending, bad)
+                pending.clear()
+        else:
+            bad.missing(row)
+
+    if pending:
+        total += _sum_amounts(pending, bad)
+
+    stats.rows += rows
+    stats.total += total
+    bad.summary()
+    return stats
+
+
+def _aggregate_rows_into(reader: Iterator[List[str]], index: int, stats: CsvStats, bad: _BadRowLog, sink: RowSink) -> CsvStats:
+    # Per-row variant of aggregate_csv: the sink needs to know which rows are clean
+    for row in reader:
+        if not row:
+            continue
+        stats.rows += 1
+        if len(row) <= index:
+            bad.missing(row)
+            continue
+        try:
+            amount = int(row[index])
+        except ValueError:
+            bad.invalid(row[index])
+            continue
+        stats.total += amount
+        sink.add(row, amount)
+
+    bad.summary()
+    return stats
+
+
+def _amount_key(obj: dict) -> Optional[str]:
+    # Same normalization as find_amount_index: " Amount " -> "amount", last wins
+    found = None
+    for name in obj:
+        if name.strip().lower() == "amount":
+            found = name
+    return found
+
+
+def _parse_amount(value: Any) -> int:
+    if type(value) is int:
+        return value
+    if isinstance(value, str):
+        return int(value)
+    # floats, bools, null, nested values: same as a non-integer CSV cell
+    raise ValueError(value)
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def aggregate_ndjson(
+    lines: Iterable[str],
+    stats: Optional[CsvStats] = None,
+    sink: Optional[RowSink] = None,
+) -> CsvStats:
+    """
+    NDJSON counterpart of aggregate_csv (one JSON object per line), with the
+    same CsvStats contract: blank lines are not rows, objects without an
+    `amount` key count as missing, other values than integers (or integer
+    strings) and lines that aren't JSON objects count as invalid.
+    The sink gets the keys of the first object as header.
+    """
+    stats = stats if stats is not None else CsvStats()
+    bad = _BadRowLog(stats)
+    columns: Optional[List[str]] = None
+
+    for line in lines:
+        if not line.strip():
+            continue
+        stats.rows += 1
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            bad.invalid(line.strip()[:200])
+            continue
+        if not isinstance(obj, dict):
+            bad.invalid(line.strip()[:200])
+            continue
+
+        key = _amount_key(obj)
+        if key is None:
+            bad.missing(list(obj))
+            continue
+        try:
+            amount = _parse_amount(obj[key])
+        except ValueError:
+            bad.invalid(obj[key])
+            continue
+        stats.total += amount
+
+        if sink is not None:
+            if columns is None:
+                columns = list(obj)
+                sink.start(columns, columns.index(key))
+            sink.add([_cell(obj.get(name)) for name in columns], amount)
+
+    bad.summary()
+    return stats
@@ -1,20 +1,192 @@
-from typing import Dict
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
 
 class EventValidationError(Exception):
     """Raised when an incoming event is invalid"""
     pass
 
-def validate_event(event: Dict) -> None:
+PayloadValidator = Callable[[dict], None]
+FieldType = Union[Type, Tuple[Type, ...]]
+
+# Numeric payload fields (bool is excluded: it's an int subclass)
+NUMBER: Tuple[Type, ...] = (int, float)
+
+REQUIRED_FIELDS = frozenset({"source", "type", "payload"})
+
+# type -> handler / compiled payload validator, filled by @register_event at import
+EVENT_HANDLERS: Dict[str, Callable] = {}
+PAYLOAD_VALIDATORS: Dict[str, PayloadValidator] = {}
+BATCH_EVENT_TYPES = set()
+
+
+def compile_schema(event_type: str, schema: Dict[str, FieldType]) -> PayloadValidator:
+    """
+    Turns {"order_id": int, "amount": NUMBER} into a validator function, once.
+    Every field is required; types are checked exactly (True is not an int).
+    """
+    fields = tuple(
+        (name, frozenset(types if isinstance(types, tuple) else (types,)))
+        for name, types in schema.items()
+    )
+    type_names = {
+        name: " or ".join(sorted(t.__name__ for t in types)) for name, types in fields
+    }
+
+    def validate(payload: dict) -> None:
+        if not isinstance(payload, dict):
+            raise EventValidationError(f"Payload of {event_type} must be a dict")
+        for name, types in fields:
+            if name not in payload:
+                raise EventValidationError(f"Invalid {event_type} payload: missing '{name}'")
+            if type(payload[name]) not in types:
+                raise EventValidationError(
+                    f"Invalid {event_type} payload: '{name}' must be {type_names[name]}, "
+                    f"got {type(payload[name]).__name__}"
+                )
+
+    return validate
+
+
+def register_event(
+    event_type: str,
+    schema: Optional[Dict[str, FieldType]] = None,
+    batch: bool = False,
+) -> Callable[[Callable], Callable]:
+    """
+    Decorator registering the handler of a custom event type:
+
+        @register_event("OrderCreated", schema={"order_id": int, "amount": NUMBER})
+        def handle_order_created(payload: dict) -> None: ...
+
+    With batch=True the handler receives the list of payloads of that type.
+    """
+    validator = compile_schema(event_type, schema or {})
+
+    def decorator(fn: Callable) -> Callable:
+        if event_type in EVENT_HANDLERS:
+            raise ValueError(f"Handler already registered for '{event_type}'")
+        EVENT_HANDLERS[event_type] = fn
+        PAYLOAD_VALIDATORS[event_type] = validator
+        if batch:
+            BATCH_EVENT_TYPES.add(event_type)
+        return fn
+
+    return decorator
+
+
+def validate_event(event: Dict) -> Callable:
+    """Validates envelope + payload and returns the registered handler."""
     if not isinstance(event, dict):
         raise EventValidationError("Event must be a dict")
-    required_fields = {"source", "type", "payload"}
-    missing = required_fields - event.keys()
 
+    missing = REQUIRED_FIELDS - event.keys()
     if missing:
         raise EventValidationError(f"Missing fields: {missing}")
-    
-    allowed_types = {"UserRegistered", "OrderCreated"}
-    if event["type"] not in allowed_types:
+
+    event_type = event["type"]
+    handler = EVENT_HANDLERS.get(event_type) if isinstance(event_type, str) else None
+    if handler is None:
         raise EventValidationError(
-            f"Unsupported event type: {event['type']}"
+            f"Unsupported event type: {event_type}"
         )
+
+    PAYLOAD_VALIDATORS[event_type](event["payload"])
+    return handler
+
+
+
+def call_handler(event_type: str, handler: Callable, payloads: List[dict]) -> None:
+    if event_type in BATCH_EVENT_TYPES:
+        handler(payloads)
+    else:
+        for payload in payloads:
+            handler(payload)
+
+
+def is_custom_event(message: Any) -> bool:
+    """{source, type, payload} events and EventBridge envelopes."""
+    return isinstance(message, dict) and (
+        ("type" in message and "payload" in message) or ("detail-type" in message and "detail" in message)
+    )
+
+
+def normalize_event(event: Any) -> Any:
+    """EventBridge envelope -> {source, type, payload}; anything else unchanged."""
+    if isinstance(event, dict) and "detail-type" in event and "detail" in event:
+        return {"source": event.get("source"), "type": event["detail-type"], "payload": event["detail"]}
+    return event
+
+
+def is_event_batch(event: Any) -> bool:
+    """A list of events, or SQS records carrying custom events (S3 is routed before)."""
+    return isinstance(event, list) or (isinstance(event, dict) and isinstance(event.get("Records"), list))
+
+
+def _batch_items(event: Any) -> List[Tuple[Optional[str], Any]]:
+    if isinstance(event, list):
+        return [
+            (item.get("id") if isinstance(item, dict) and "detail-type" in item else str(i), normalize_event(item))
+            for i, item in enumerate(event)
+        ]
+
+    items: List[Tuple[Optional[str], Any]] = []
+    for record in event["Records"]:
+        item_id = record.get("messageId") if isinstance(record, dict) else None
+        try:
+            items.append((item_id, normalize_event(json.loads(record["body"]))))
+        except (ValueError, KeyError, TypeError) as e:
+            # Kept as an invalid item: the error is reported with the item status
+            items.append((item_id, EventValidationError(f"Malformed SQS record: {e}")))
+    return items
+
+
+def process_event_batch(event: Any) -> Dict[str, object]:
+    """
+    Validates every item, then dispatches them grouped by type: batch
+    handlers get all payloads of their type in a single call.
+
+    Invalid items are reported but not retried (same as a 400 for a single
+    event); items whose handler raised go to batchItemFailures, so SQS
+    only redelivers those.
+    """
+    results: List[Dict[str, object]] = []
+    payloads: List[Any] = []
+    groups: Dict[str, List[int]] = {}
+
+    for item_id, item in _batch_items(event):
+        result: Dict[str, object] = {"item_id": item_id, "type": None, "status": "ok"}
+        results.append(result)
+        payloads.append(None)
+        try:
+            if isinstance(item, EventValidationError):
+                raise item
+            validate_event(item)
+        except EventValidationError as e:
+            logger.error("Invalid event in batch | item_id=%s error=%s", item_id, e)
+            result.update(status="invalid", error=str(e))
+            continue
+        result["type"] = item["type"]
+        payloads[-1] = item["payload"]
+        groups.setdefault(item["type"], []).append(len(results) - 1)
+
+    for event_type, indexes in groups.items():
+        handler = EVENT_HANDLERS[event_type]
+        if event_type in BATCH_EVENT_TYPES:
+            chunks = [indexes]
+        else:
+            chunks = [[i] for i in indexes]
+
+        for chunk in chunks:
+            try:
+                call_handler(event_type, handler, [payloads[i] for i in chunk])
+            except Exception as e:
+                logger.exception("Handler failed | type=%s items=%s", event_type, len(chunk))
+                for i in chunk:
+                    results[i].update(status="failed", error=str(e))
+
+    failures = [{"itemIdentifier": r["item_id"]} for r in results if r["status"] == "failed" and r["item_id"] is not None]
+    return {"results": results, "batchItemFailures": failures}
@@ -0,0 +1,422 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from app.cache import TTLCache
+from app.clients import get_client
+from app.config import settings
+from app.csv_engine import CsvStats
+from app.logger import get_logger
+from app.metrics import timed
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_TABLE = os.getenv("IDEMPOTENCY_TABLE", "")
+
+# TransactWriteItems accepts at most 100 actions per call
+TRANSACT_MAX_ITEMS = 100
+
+# pks marked DONE by this warm container: known duplicates skip DynamoDB
+done_cache = TTLCache(
+    max_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=settings.IDEMPOTENCY_CACHE_TTL,
+)
+
+
+# PROCESSING records with a checkpoint returned by failed claims (ALL_OLD),
+# per pk: reclaim_stale only tries to take over these, and only when stale
+resumable_claims = TTLCache(max_size=1024, ttl_seconds=60)
+
+
+class ClaimLostError(Exception):
+    """Raised when a stale claim was taken over by another invocation"""
+    pass
+
+
+@dataclass
+class Checkpoint:
+    """
+    Progress of an object saved on its idempotency record: the partial
+    stats up to `offset`, a line boundary. `attempt` identifies the claim
+    (0 = first claim, +1 on every stale reclaim). Only records with a saved
+    checkpoint are resumable: the other paths don't send heartbeats.
+    """
+    attempt: int = 0
+    offset: int = 0
+    header: Optional[str] = None
+    stats: CsvStats = field(default_factory=CsvStats)
+
+
+def idempotency_enabled() -> bool:
+    return bool(IDEMPOTENCY_TABLE)
+
+
+def checkpoints_enabled() -> bool:
+    return bool(IDEMPOTENCY_TABLE) and settings.CHECKPOINT_BYTES > 0
+
+
+def build_idempotency_key(bucket: str, key: str, etag: str | None, sequencer: str | None) -> str:
+    # Preferimos eTag si existe (cambia cuando cambia el contenido)
+    uniq = etag or sequencer or "unknown"
+    return f"{bucket}#{key}#{uniq}"
+
+
+def _remember_conflict(pk: str, item: Optional[dict]) -> None:
+    """Keeps the record that made a claim fail if a stale reclaim could resume it."""
+    if item and item.get("status", {}).get("S") == "PROCESSING" and "checkpoint" in item:
+        resumable_claims.set(pk, item)
+
+
+def _claim_item(pk: str, now: int, ttl_seconds: int) -> dict:
+    return {
+        "pk": {"S": pk},
+        "status": {"S": "PROCESSING"},
+        "created_at": {"N": str(now)},
+        "updated_at": {"N": str(now)},
+        "attempt": {"N": "0"},
+        "expires_at": {"N": str(now + ttl_seconds)},
+    }
+
+
+@timed("ClaimLatency")
+def claim_once(pk: str, ttl_seconds: int = 3600) -> bool:
+    """
+    Attempts to claim processing for this pk using a conditional PutItem.
+    True -> claimed (process)
+    False -> already claimed/processed (skip)
+    """
+    if not IDEMPOTENCY_TABLE:
+        logger.warning("IDEMPOTENCY_TABLE not set. Running without idempotency.")
+        return True
+
+    if pk in done_cache:
+        logger.info("Idempotency claim skipped (cached DONE) | pk=%s", pk)
+        return False
+
+    from botocore.exceptions import ClientError
+
+    now = int(time.time())
+
+    try:
+        get_client("dynamodb").put_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Item=_claim_item(pk, now, ttl_seconds),
+            ConditionExpression="attribute_not_exists(pk)",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        logger.info("Idempotency claim succeeded | pk=%s", pk)
+        return True
+
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code == "ConditionalCheckFailedException":
+            logger.warning("Idempotency claim failed (duplicate) | pk=%s", pk)
+            _remember_conflict(pk, e.response.get("Item"))
+            return False
+
+        logger.exception("Idempotency claim error | pk=%s code=%s", pk, code)
+        raise
+
+
+def _claim_or_unknown(pk: str, ttl_seconds: int) -> Optional[bool]:
+    """claim_once, with None instead of an error: nobody knows if the put landed."""
+    try:
+        return claim_once(pk, ttl_seconds)
+    except Exception:
+        logger.exception("Idempotency claim state unknown | pk=%s", pk)
+        return None
+
+
+def _transact_claims(pks: List[str], now: int, ttl_seconds: int) -> List[Optional[bool]]:
+    """
+    Claims up to TRANSACT_MAX_ITEMS pks in one TransactWriteItems round trip,
+    with the same conditional put as claim_once. A transaction is all or
+    nothing: when some pks already exist it is cancelled, the duplicates are
+    read from CancellationReasons and the rest is retried.
+    """
+    from botocore.exceptions import ClientError
+
+    claimed: List[Optional[bool]] = [False] * len(pks)
+    pending = list(range(len(pks)))
+
+    while pending:
+        try:
+            get_client("dynamodb").transact_write_items(
+                TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": IDEMPOTENCY_TABLE,
+                            "Item": _claim_item(pks[i], now, ttl_seconds),
+                            "ConditionExpression": "attribute_not_exists(pk)",
+                            "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+                        }
+                    }
+                    for i in pending
+                ]
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException":
+                raise
+
+            reasons = e.response.get("CancellationReasons") or []
+            codes = [r.get("Code", "None") for r in reasons]
+            if len(codes) != len(pending) or any(c not in ("None", "ConditionalCheckFailed") for c in codes):
+                # Throttling/conflicts: fall back to one conditional put per pk
+                logger.warning("Batched claim cancelled, claiming one by one | reasons=%s", codes)
+                for i in pending:
+                    claimed[i] = _claim_or_unknown(pks[i], ttl_seconds)
+                return claimed
+
+            for i, code, reason in zip(pending, codes, reasons):
+                if code == "ConditionalCheckFailed":
+                    logger.warning("Idempotency claim failed (duplicate) | pk=%s", pks[i])
+                    _remember_conflict(pks[i], reason.get("Item"))
+            pending = [i for i, code in zip(pending, codes) if code == "None"]
+            continue
+
+        for i in pending:
+            claimed[i] = True
+            logger.info("Idempotency claim succeeded | pk=%s", pks[i])
+        pending = []
+
+    return claimed
+
+
+@timed("BatchClaimLatency")
+def claim_many(pks: List[str], ttl_seconds: int = 3600) -> List[Optional[bool]]:
+    """
+    Batched claim_once for a multi-record event. Returns one flag per pk, in order.
+    Cached DONE pks and repeated pks in the same batch are duplicates without
+    any network I/O; the rest is claimed with TransactWriteItems.
+    A group that fails doesn't lose the claims of earlier groups: its pks
+    are None (unknown), for the caller to claim one by one.
+    """
+    if not IDEMPOTENCY_TABLE:
+        logger.warning("IDEMPOTENCY_TABLE not set. Running without idempotency.")
+        return [True] * len(pks)
+
+    claimed: List[Optional[bool]] = [False] * len(pks)
+    to_claim: List[int] = []
+    seen = set()
+
+    for i, pk in enumerate(pks):
+        if pk in seen:
+            logger.warning("Idempotency claim failed (duplicate in batch) | pk=%s", pk)
+            continue
+        seen.add(pk)
+        if pk in done_cache:
+            logger.info("Idempotency claim skipped (cached DONE) | pk=%s", pk)
+            continue
+        to_claim.append(i)
+
+    now = int(time.time())
+    for start in range(0, len(to_claim), TRANSACT_MAX_ITEMS):
+        group = to_claim[start:start + TRANSACT_MAX_ITEMS]
+        if len(group) == 1:
+            # A single conditional put is cheaper than a transaction
+            claimed[group[0]] = _claim_or_unknown(pks[group[0]], ttl_seconds)
+            continue
+        try:
+            flags = _transact_claims([pks[i] for i in group], now, ttl_seconds)
+        except Exception:
+            logger.exception("Batched claim error, claim state unknown | pks=%s", len(group))
+            flags = [None] * len(group)
+        for i, ok in zip(group, flags):
+            claimed[i] = ok
+
+    return claimed
+
+
+@timed("MarkDoneLatency")
+def mark_done(pk: str) -> None:
+    if not IDEMPOTENCY_TABLE:
+        return
+
+    get_client("dynamodb").update_item(
+        TableName=IDEMPOTENCY_TABLE,
+        Key={"pk": {"S": pk}},
+        UpdateExpression="SET #s = :done",
+        ExpressionAttributeNames={"#s": "status"},
+        ExpressionAttributeValues={":done": {"S": "DONE"}},
+    )
+    done_cache.set(pk)
+    logger.info("Marked DONE | pk=%s", pk)
+
+
+@timed("BatchMarkDoneLatency")
+def mark_done_many(pks: List[str]) -> None:
+    """Writes the DONE markers of a batch at the end, in one transaction per 100 pks."""
+    if not IDEMPOTENCY_TABLE or not pks:
+        return
+
+    pks = list(dict.fromkeys(pks))
+    for start in range(0, len(pks), TRANSACT_MAX_ITEMS):
+        group = pks[start:start + TRANSACT_MAX_ITEMS]
+        if len(group) == 1:
+            mark_done(group[0])
+            continue
+
+        get_client("dynamodb").transact_write_items(
+            TransactItems=[
+                {
+                    "Update": {
+                        "TableName": IDEMPOTENCY_TABLE,
+                        "Key": {"pk": {"S": pk}},
+                        "UpdateExpression": "SET #s = :done",
+                        "ExpressionAttributeNames": {"#s": "status"},
+                        "ExpressionAttributeValues": {":done": {"S": "DONE"}},
+                    }
+                }
+                for pk in group
+            ]
+        )
+        for pk in group:
+            done_cache.set(pk)
+        logger.info("Marked DONE | pks=%s", len(group))
+
+
+@timed("ReleaseClaimLatency")
+def release_claim(pk: str, attempt: Optional[int] = None) -> bool:
+    """
+    Deletes the PROCESSING claim of a record that failed, so its retry
+    (SQS redelivery, async invocation retry) processes the object again
+    instead of skipping it as a duplicate. DONE records are never deleted,
+    and with `attempt` neither is a claim another invocation took over.
+    Best effort: returns False when nothing was released.
+    """
+    if not IDEMPOTENCY_TABLE:
+        return False
+
+    from botocore.exceptions import ClientError
+
+    condition = "#s = :processing"
+    names = {"#s": "status"}
+    values = {":processing": {"S": "PROCESSING"}}
+    if attempt is not None:
+        condition += " AND #a = :attempt"
+        names["#a"] = "attempt"
+        values[":attempt"] = {"N": str(attempt)}
+
+    try:
+        get_client("dynamodb").delete_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Key={"pk": {"S": pk}},
+            ConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            logger.warning("Claim not released (no longer ours) | pk=%s", pk)
+        else:
+            logger.exception("Failed releasing claim | pk=%s", pk)
+        return False
+
+    logger.info("Released claim | pk=%s", pk)
+    return True
+
+
+def _checkpoint_from_item(item: dict) -> Checkpoint:
+    saved = item.get("checkpoint", {}).get("M", {})
+
+    def number(name: str) -> int:
+        return int(saved[name]["N"]) if name in saved else 0
+
+    return Checkpoint(
+        attempt=int(item.get("attempt", {}).get("N", "0")),
+        offset=number("offset"),
+        header=saved["header"]["S"] if "header" in saved else None,
+        stats=CsvStats(total=number("total"), rows=number("rows"), missing=number("missing"), invalid=number("invalid")),
+    )
+
+
+@timed("CheckpointLatency")
+def save_checkpoint(pk: str, checkpoint: Checkpoint) -> None:
+    """
+    Stores the progress on the PROCESSING record and refreshes its
+    `updated_at` heartbeat. Raises ClaimLostError when the claim was
+    reclaimed by another invocation in the meantime.
+    """
+    from botocore.exceptions import ClientError
+
+    stats = checkpoint.stats
+    try:
+        get_client("dynamodb").update_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Key={"pk": {"S": pk}},
+            UpdateExpression="SET #c = :checkpoint, updated_at = :now",
+            ConditionExpression="#s = :processing AND #a = :attempt",
+            ExpressionAttributeNames={"#s": "status", "#a": "attempt", "#c": "checkpoint"},
+            ExpressionAttributeValues={
+                ":checkpoint": {
+                    "M": {
+                        "offset": {"N": str(checkpoint.offset)},
+                        "header": {"S": checkpoint.header or ""},
+                        "total": {"N": str(stats.total)},
+                        "rows": {"N": str(stats.rows)},
+                        "missing": {"N": str(stats.missing)},
+                        "invalid": {"N": str(stats.invalid)},
+                    }
+                },
+                ":now": {"N": str(int(time.time()))},
+                ":processing": {"S": "PROCESSING"},
+                ":attempt": {"N": str(checkpoint.attempt)},
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise ClaimLostError(f"Claim of {pk} was taken over (attempt {checkpoint.attempt})") from e
+        raise
+
+    logger.info("Checkpoint saved | pk=%s offset=%s rows=%s", pk, checkpoint.offset, stats.rows)
+
+
+@timed("ReclaimLatency")
+def reclaim_stale(pk: str, stale_seconds: int, ttl_seconds: int = 3600) -> Optional[Checkpoint]:
+    """
+    Called when a claim fails: takes over a resumable PROCESSING record whose
+    heartbeat is older than `stale_seconds` (its invocation timed out or
+    crashed) and returns its checkpoint. None -> DONE, not resumable, or
+    still alive (a real duplicate). Only the record returned by the failed
+    claim is considered, so real duplicates cost no extra request.
+    """
+    if not checkpoints_enabled() or pk in done_cache:
+        return None
+
+    now = int(time.time())
+    item = resumable_claims.get(pk)
+    if item is None or int(item.get("updated_at", {}).get("N", "0")) >= now - stale_seconds:
+        return None
+
+    from botocore.exceptions import ClientError
+
+    try:
+        response = get_client("dynamodb").update_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Key={"pk": {"S": pk}},
+            UpdateExpression="SET updated_at = :now, expires_at = :expires, #a = if_not_exists(#a, :zero) + :one",
+            # Re-checked: another invocation may have reclaimed it meanwhile
+            ConditionExpression="#s = :processing AND attribute_exists(#c) AND updated_at < :stale",
+            ExpressionAttributeNames={"#s": "status", "#a": "attempt", "#c": "checkpoint"},
+            ExpressionAttributeValues={
+                ":now": {"N": str(now)},
+                ":expires": {"N": str(now + ttl_seconds)},
+                ":stale": {"N": str(now - stale_seconds)},
+                ":processing": {"S": "PROCESSING"},
+                ":zero": {"N": "0"},
+                ":one": {"N": "1"},
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        logger.exception("Stale claim check error | pk=%s", pk)
+        raise
+
+    checkpoint = _checkpoint_from_item(response["Attributes"])
+    logger.warning(
+        "Reclaimed stale claim | pk=%s attempt=%s offset=%s", pk, checkpoint.attempt, checkpoint.offset
+    )
+    return checkpoint
@@ -1,19 +1,152 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import queue
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterator, Optional
+
 from app.config import settings
 
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+
+# Per-invocation fields (request_id, pk...) added to every JSON log line.
+# A ContextVar, so each thread/record of a batch keeps its own values.
+_log_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+_loggers: Dict[str, logging.Logger] = {}
+_listener: Optional[QueueListener] = None
+_queue: Optional[queue.Queue] = None
+
+
+def bind_context(**fields: Any) -> contextvars.Token:
+    """Adds fields to the log context; pass the token to unbind_context()."""
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+def unbind_context(token: contextvars.Token) -> None:
+    _log_context.reset(token)
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    token = bind_context(**fields)
+    try:
+        yield
+    finally:
+        unbind_context(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the bound context onto the record in the thread that logs it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _log_context.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, queryable with CloudWatch Logs Insights."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "context", {}))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _ContextQueueHandler(QueueHandler):
+    """
+    Hands records to the background listener. Only the %-merge of the message
+    happens on the caller thread; JSON serialization and stream I/O don't.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def _queue_handler() -> logging.Handler:
+    global _listener, _queue
+
+    if _listener is None:
+        _queue = queue.Queue(-1)
+        stream = logging.StreamHandler()
+        stream.setFormatter(_formatter())
+        _listener = QueueListener(_queue, stream, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_stop_listener)
+
+    return _ContextQueueHandler(_queue)
+
+
+def _stop_listener() -> None:
+    global _listener, _queue
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = None
+    _queue = None
+
+
+def _build_handler() -> logging.Handler:
+    if settings.LOG_ASYNC:
+        handler = _queue_handler()
+    else:
+        handler = logging.StreamHandler()
+        handler.setFormatter(_formatter())
+    handler.addFilter(ContextFilter())
+    return handler
+
+
 def get_logger(name: str) -> logging.Logger:
 
     logger = logging.getLogger(name)
-    
+
     logger.setLevel(settings.LOG_LEVEL)
 
     logger.propagate = False
 
     if not logger.handlers:
-        handler = logging.StreamHandler()
-        formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s")
-
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(_build_handler())
 
+    _loggers[name] = logger
     return logger
+
+
+def configure_logging() -> None:
+    """Rebuilds the handlers of every logger after LOG_FORMAT/LOG_ASYNC changed."""
+    flush_logs()
+    _stop_listener()
+    for logger in _loggers.values():
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.setLevel(settings.LOG_LEVEL)
+        logger.addHandler(_build_handler())
+
+
+def flush_logs() -> None:
+    """Blocks until queued records are written (call before the invocation ends)."""
+    if _queue is not None:
+        _queue.join()
@@ -1,60 +1,102 @@
-from app.logger import get_logger
+from typing import List
+
+from app.logger import flush_logs, get_logger, log_context
 from app.config import settings, ConfigError
-from app.events import validate_event, EventValidationError
-from app.S3_processor import is_s3_event, parse_s3_event, process_s3_object
+from app.events import (
+    NUMBER,
+    EventValidationError,
+    call_handler,
+    is_event_batch,
+    normalize_event,
+    process_event_batch,
+    register_event,
+    validate_event,
+)
+from app.S3_processor import S3BatchError, is_s3_event, parse_s3_records, process_s3_batch
 
 
 logger = get_logger(__name__)
 
 
+@register_event("UserRegistered", schema={"user_id": int})
 def handle_user_registered(payload: dict) -> None:
     logger.info(
-        f"Handling UserRegistered | user_id={payload.get('user_id')}"
+        "Handling UserRegistered | user_id=%s", payload.get("user_id")
     )
 
-def handle_order_created(payload: dict) -> None:
+@register_event("OrderCreated", schema={"order_id": int, "amount": NUMBER}, batch=True)
+def handle_order_created(payloads: List[dict]) -> None:
+    # Batch handler: all the orders of the invocation in one call
     logger.info(
-        f"Handling OrderCreated | order_id={payload.get('order_id')} amount={payload.get('amount')}"
+        "Handling OrderCreated | orders=%s amount=%s", len(payloads), sum(p["amount"] for p in payloads)
     )
 
-EVENT_HANDLERS = {
-    "UserRegistered": handle_user_registered,
-    "OrderCreated": handle_order_created,
-}
-
 def handler(event, context):
 
     request_id = getattr(context, "aws_request_id", "local")
-    logger.info(f"Start | request_id={request_id}")
+    # Every log line of this invocation (any thread) carries the request_id
+    with log_context(request_id=request_id):
+        try:
+            logger.info("Start | request_id=%s", request_id)
+            return _route(event, request_id)
+        finally:
+            # Queued logs must be written before Lambda freezes the container
+            flush_logs()
 
 
+def _route(event, request_id: str):
+
     # 1) S3 event
     if is_s3_event(event):
-        logger.info(f"Routing to S3 processor | request_id={request_id}")
-        info = parse_s3_event(event)
-        result = process_s3_object(info)
-        logger.info(f"End S3 | request_id={request_id} result={result}")
-        return {"statusCode": 200, "body": f"s3 processed {result}"}
-
-    # 2) Custom events
+        logger.info("Routing to S3 processor | request_id=%s", request_id)
+        infos = parse_s3_records(event)
+        batch = process_s3_batch(infos)
+        failures = batch["batchItemFailures"]
+
+        # Only SQS understands partial batch responses. Direct S3/SNS async
+        # invocations retry on error, and idempotency skips the records that
+        # already succeeded.
+        if failures and any(info.get("source") != "aws:sqs" for info in infos):
+            raise S3BatchError(f"{len(failures)} S3 record(s) failed: {failures}")
+
+        logger.info("End S3 | request_id=%s results=%s", request_id, batch["results"])
+        return {
+            "statusCode": 200,
+            "body": f"s3 processed {batch['results']}",
+            "results": batch["results"],
+            "batchItemFailures": failures,
+        }
+
+    # 2) Batch of custom events: list, SQS records or EventBridge envelopes
+    if is_event_batch(event):
+        batch = process_event_batch(event)
+        failures = batch["batchItemFailures"]
+        logger.info(
+            "End custom batch | request_id=%s items=%s failed=%s", request_id, len(batch["results"]), len(failures)
+        )
+        return {
+            "statusCode": 200,
+            "body": f"events processed {len(batch['results'])}",
+            "results": batch["results"],
+            "batchItemFailures": failures,
+        }
+
+    # 3) Custom event
     try:
-        validate_event(event)
+        event = normalize_event(event)
+        # One registry lookup: validates the payload and returns its handler
+        handler_fn = validate_event(event)
         event_type = event["type"]
-        payload = event["payload"]
-
-        logger.info(f"Routing custom event | type={event_type} request_id={request_id}")
 
-        handler_fn = EVENT_HANDLERS.get(event_type)
-        if not handler_fn:
-            raise EventValidationError(f"No handler registered for '{event_type}'")
+        logger.info("Routing custom event | type=%s request_id=%s", event_type, request_id)
 
-        handler_fn(payload)
+        call_handler(event_type, handler_fn, [event["payload"]])
 
-        logger.info(f"End custom | request_id={request_id} type={event_type}")
+        logger.info("End custom | request_id=%s type=%s", request_id, event_type)
         return {"statusCode": 200, "body": "ok"}
 
     except EventValidationError as e:
-        logger.error(f"Invalid event: {e}")
+        logger.error("Invalid event: %s", e)
         return {"statusCode": 400, "body": str(e)}
     except Exception:
         logger.exception("Unhandled error")
@@ -66,7 +108,7 @@ def main() -> None:
     try:
         logger.info("Service started")
         logger.info(
-            f"Running service | service={settings.SERVICE_NAME} env={settings.ENVIRONMENT}"
+            "Running service | service=%s env=%s", settings.SERVICE_NAME, settings.ENVIRONMENT
         )
         # Simulación de "lógica"
         # En los próximos días aquí procesaremos eventos reales
@@ -74,12 +116,12 @@ def main() -> None:
 
     except ConfigError as e:
         # Config mala -> error claro y salida
-        logger.error(f"Configuration error: {e}")
+        logger.error("Configuration error: %s", e)
         raise
 
     except Exception as e:
         #Cualquier otro error inesperado
-        logger.exception(f"Unexpected error: {e}")
+        logger.exception("Unexpected error: %s", e)
         raise
 
 
@@ -0,0 +1,137 @@
+import contextvars
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO
+
+from app.config import settings
+
+# Metrics of the unit of work in progress (one S3 object, one batch...).
+# Copied contexts (thread pools) share the same Metrics object.
+_current: contextvars.ContextVar[Optional["Metrics"]] = contextvars.ContextVar("metrics", default=None)
+
+
+class Metrics:
+    """
+    Collects values for one unit of work and writes them as a single
+    CloudWatch Embedded Metric Format (EMF) log line: CloudWatch extracts
+    the metrics from the log, no PutMetricData calls needed.
+    Values recorded twice under the same name are added up.
+    """
+
+    def __init__(self, namespace: Optional[str] = None, dimensions: Optional[Dict[str, str]] = None) -> None:
+        self.namespace = namespace or settings.METRICS_NAMESPACE
+        self.dimensions = dimensions or {"Service": settings.SERVICE_NAME}
+        self.values: Dict[str, float] = {}
+        self.units: Dict[str, str] = {}
+        self.properties: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: float, unit: str = "Count") -> None:
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def set_property(self, name: str, value: Any) -> None:
+        self.properties[name] = value
+
+    def to_emf(self) -> Dict[str, Any]:
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(self.dimensions)],
+                        "Metrics": [{"Name": name, "Unit": self.units[name]} for name in self.values],
+                    }
+                ],
+            },
+            **self.dimensions,
+            **self.properties,
+            **{name: round(value, 3) for name, value in self.values.items()},
+        }
+
+    def emit(self, stream: Optional[TextIO] = None) -> None:
+        if not self.values:
+            return
+        print(json.dumps(self.to_emf(), default=str), file=stream or sys.stdout, flush=True)
+
+
+def current_metrics() -> Optional[Metrics]:
+    return _current.get()
+
+
+def add_metric(name: str, value: float, unit: str = "Count") -> None:
+    """Records into the current scope; no-op outside of one (or when disabled)."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(name, value, unit)
+
+
+@contextmanager
+def metrics_scope(**properties: Any) -> Iterator[Metrics]:
+    """Opens a unit of work; its metrics are emitted when the block exits."""
+    metrics = Metrics()
+    for name, value in properties.items():
+        metrics.set_property(name, value)
+
+    token = _current.set(metrics if settings.METRICS_ENABLED else None)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+        if settings.METRICS_ENABLED:
+            metrics.emit()
+
+
+class timed:
+    """
+    Records the elapsed milliseconds of a block or function as `name`:
+
+        with timed("S3GetObjectLatency"): ...
+
+        @timed("ClaimLatency")
+        def claim_once(...): ...
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._start = 0.0
+
+    def __enter__(self) -> "timed":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        add_metric(self.name, (time.perf_counter() - self._start) * 1000, "Milliseconds")
+        return False
+
+    def __call__(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # A fresh timer per call: the decorated function may run in several threads
+            with timed(self.name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+
+class MeteredBody:
+    """Wraps a StreamingBody: counts bytes read and time spent waiting on S3."""
+
+    def __init__(self, body: Any) -> None:
+        self._body = body
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        start = time.perf_counter()
+        data = self._body.read(amt)
+        add_metric("S3ReadTime", (time.perf_counter() - start) * 1000, "Milliseconds")
+        add_metric("BytesRead", len(data), "Bytes")
+        return data
+
+    def close(self) -> None:
+        self._body.close()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.cache import TTLCache
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import add_metric
+
+logger = get_logger(__name__)
+
+# Aggregate results per object version (idempotency key bucket#key#etag),
+# for containers running without IDEMPOTENCY_TABLE: replays and re-drives
+# of the same version are answered without reading S3 again.
+result_cache = TTLCache(
+    max_size=settings.RESULT_CACHE_SIZE,
+    ttl_seconds=settings.RESULT_CACHE_TTL,
+)
+
+# Optional second tier under RESULT_CACHE_DIR (e.g. /tmp/result-cache): one
+# small JSON file per pk, it outlives the in-memory LRU while the execution
+# environment lives. Pruned to RESULT_CACHE_DISK_SIZE files, oldest first.
+_PRUNE_EVERY = 100
+
+_lock = threading.Lock()
+_disk_hits = 0
+_disk_writes = 0
+
+
+def cache_enabled() -> bool:
+    return settings.RESULT_CACHE_SIZE > 0
+
+
+def _disk_path(pk: str) -> Optional[Path]:
+    if not settings.RESULT_CACHE_DIR:
+        return None
+    # Keys contain "/" and "#": the file name is a hash of the pk
+    return Path(settings.RESULT_CACHE_DIR) / f"{hashlib.sha256(pk.encode('utf-8')).hexdigest()}.json"
+
+
+def _read_disk(pk: str) -> Optional[Dict[str, object]]:
+    path = _disk_path(pk)
+    if path is None:
+        return None
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("pk") != pk or entry.get("expires_at", 0) <= time.time():
+        path.unlink(missing_ok=True)
+        return None
+    return entry["result"]
+
+
+def _write_disk(pk: str, result: Dict[str, object]) -> None:
+    global _disk_writes
+
+    path = _disk_path(pk)
+    if path is None:
+        return
+    entry = {"pk": pk, "expires_at": time.time() + settings.RESULT_CACHE_TTL, "result": result}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write + rename: concurrent readers never see half a file
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(entry, default=str), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        logger.warning("Could not write result cache file | path=%s", path, exc_info=True)
+        return
+
+    with _lock:
+        _disk_writes += 1
+        prune = _disk_writes % _PRUNE_EVERY == 0
+    if prune:
+        _prune_disk(path.parent)
+
+
+def _prune_disk(folder: Path) -> None:
+    try:
+        files = sorted(folder.glob("*.json"), key=lambda p: p.stat().st_mtime)
+    except OSError:
+        return
+    for path in files[: max(0, len(files) - settings.RESULT_CACHE_DISK_SIZE)]:
+        path.unlink(missing_ok=True)
+
+
+def get_result(pk: str) -> Optional[Dict[str, object]]:
+    """Cached result of this object version: memory first, then the disk tier."""
+    global _disk_hits
+
+    if not cache_enabled():
+        return None
+
+    result = result_cache.get(pk)
+    if result is None:
+        result = _read_disk(pk)
+        if result is not None:
+            with _lock:
+                _disk_hits += 1
+            add_metric("ResultCacheDiskHits", 1)
+            result_cache.set(pk, result)
+
+    if result is None:
+        add_metric("ResultCacheMisses", 1)
+        return None
+
+    add_metric("ResultCacheHits", 1)
+    return dict(result)
+
+
+def put_result(pk: str, result: Dict[str, object]) -> None:
+    if not cache_enabled():
+        return
+    result_cache.set(pk, dict(result))
+    _write_disk(pk, result)
+
+
+def cache_stats() -> Dict[str, int]:
+    """Counters to tune RESULT_CACHE_SIZE/TTL: memory hits and misses, disk tier hits."""
+    return {
+        "size": len(result_cache),
+        "hits": result_cache.hits,
+        "misses": result_cache.misses,
+        "disk_hits": _disk_hits,
+    }
+
+
+def clear_cache() -> None:
+    """Empties the memory tier and resets the counters (the disk tier is kept)."""
+    global _disk_hits, _disk_writes
+
+    result_cache.clear()
+    with _lock:
+        _disk_hits = 0
+        _disk_writes = 0
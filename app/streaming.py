@@ -0,0 +1,256 @@
+import io
+import itertools
+import time
+import zlib
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# 32 + 15: zlib detects the gzip (or zlib) header by itself
+_GZIP_WBITS = 47
+
+_SUFFIX_COMPRESSION = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+_NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+
+def iter_chunks(body, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Reads a file-like body (e.g. botocore StreamingBody) in fixed-size chunks.
+    Only one chunk is held in memory at a time.
+    """
+    while True:
+        chunk = body.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_text_lines(
+    chunks: Iterable[bytes],
+    encoding: str = "utf-8",
+    on_decode: Optional[Callable[[float], None]] = None,
+) -> Iterator[str]:
+    """
+    Decodes byte chunks incrementally and yields text lines (with their
+    line terminator, like a file opened with newline="").
+
+    Bytes after the last b"\\n" of a chunk are carried over to the next one,
+    so rows and multi-byte characters split across chunk boundaries are
+    reassembled. In UTF-8 the b"\\n" byte never appears inside a multi-byte
+    character, so cutting there is always safe.
+    Peak memory is ~ chunk size + longest line, whatever the object size.
+    `on_decode` receives the seconds spent decoding each block (metrics).
+    """
+    for block, _ in iter_line_blocks(chunks):
+        start = time.perf_counter()
+        # newline="" keeps \r\n untouched: csv handles the terminators itself
+        lines = io.StringIO(block.decode(encoding), newline="")
+        if on_decode is not None:
+            on_decode(time.perf_counter() - start)
+        yield from lines
+
+
+def iter_line_blocks(chunks: Iterable[bytes], offset: int = 0) -> Iterator[Tuple[bytes, int]]:
+    """
+    Regroups chunks into blocks of whole lines: bytes after the last b"\n"
+    of a chunk are carried over to the next one.
+
+    Yields (block, end) where `end` is the absolute offset right after the
+    block, i.e. a record boundary a ranged GetObject can resume from.
+    `offset` is the absolute offset of the first chunk. Only the last block
+    may lack a trailing newline.
+    """
+    pending = b""
+
+    for chunk in chunks:
+        buf = pending + chunk if pending else chunk
+        cut = buf.rfind(b"\n")
+        if cut == -1:
+            pending = buf
+            continue
+
+        pending = buf[cut + 1:]
+        offset += cut + 1
+        yield buf[:cut + 1], offset
+
+    if pending:
+        yield pending, offset + len(pending)
+
+
+def iter_range_chunks(chunks: Iterable[bytes], start: int, end: int) -> Iterator[bytes]:
+    """
+    Newline alignment for byte-range processing.
+
+    `chunks` must start at absolute offset `start - 1`. The range [start, end)
+    owns every line whose FIRST byte falls inside it: the partial line at the
+    beginning belongs to the previous range and is skipped, and the last owned
+    line is followed past `end` up to its terminating b"\\n".
+    Splitting the object at arbitrary offsets therefore yields each line
+    exactly once across all ranges (as long as no quoted field contains a newline).
+    """
+    pos = start - 1
+    skipping = True
+
+    for chunk in chunks:
+        if skipping:
+            nl = chunk.find(b"\n")
+            if nl == -1:
+                pos += len(chunk)
+                continue
+            skipping = False
+            pos += nl + 1
+            chunk = chunk[nl + 1:]
+            if pos >= end:
+                # The first line starting in this range begins after it
+                return
+
+        chunk_end = pos + len(chunk)
+        if chunk_end < end:
+            pos = chunk_end
+            yield chunk
+            continue
+
+        # The line containing byte end-1 is the last one owned by this range
+        nl = chunk.find(b"\n", max(0, end - 1 - pos))
+        if nl == -1:
+            pos = chunk_end
+            yield chunk
+            continue
+        yield chunk[:nl + 1]
+        return
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def sniff_compression(head: bytes, content_encoding: Optional[str] = None, key: str = "") -> Optional[str]:
+    """
+    "gzip", "zstd" or None (plain). Magic bytes win: a ContentEncoding
+    header or a key suffix can lie, the first bytes of the object can't.
+    """
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if head:
+        return None
+
+    encoding = (content_encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return "gzip"
+    if encoding in ("zstd", "zst"):
+        return "zstd"
+    for suffix, compression in _SUFFIX_COMPRESSION.items():
+        if key.lower().endswith(suffix):
+            return compression
+    return None
+
+
+def sniff_format(head: bytes, key: str = "") -> str:
+    """ "ndjson" or "csv", from the (decompressed) first bytes or the key suffix."""
+    name = key.lower()
+    for suffix in _SUFFIX_COMPRESSION:
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    if name.endswith(_NDJSON_SUFFIXES):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    # A CSV header never starts with "{": a JSON object per line does
+    return "ndjson" if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"{") else "csv"
+
+
+def iter_gunzip(chunks: Iterable[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Streaming gzip inflate. Each output chunk is at most `chunk_size`
+    bytes, whatever the compression ratio. Concatenated members (several
+    gzip files appended together) are decompressed one after the other.
+    """
+    decompressor = zlib.decompressobj(wbits=_GZIP_WBITS)
+    started = False
+
+    for chunk in chunks:
+        data = chunk
+        while data:
+            started = True
+            out = decompressor.decompress(data, chunk_size)
+            if out:
+                yield out
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=_GZIP_WBITS)
+                started = False
+            else:
+                data = decompressor.unconsumed_tail
+
+    if started:
+        tail = decompressor.flush()
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip stream")
+        if tail:
+            yield tail
+
+
+class _ChunkReader(io.RawIOBase):
+    """File-like view over an iterator of byte chunks (input of zstandard.stream_reader)."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while not self._buffer:
+            self._buffer = next(self._chunks, b"")
+            if not self._buffer:
+                return 0
+        n = min(len(target), len(self._buffer))
+        target[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def iter_unzstd(chunks: Iterable[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Streaming zstd decompression (optional dependency: pip install zstandard)."""
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd-compressed input needs the 'zstandard' package") from None
+
+    reader = zstandard.ZstdDecompressor().stream_reader(_ChunkReader(chunks), read_across_frames=True)
+    with reader:
+        yield from iter_chunks(reader, chunk_size)
+
+
+def open_stream(
+    chunks: Iterable[bytes],
+    key: str = "",
+    content_encoding: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[Iterator[bytes], Optional[str], str]:
+    """
+    Sniffs the raw chunks and returns (decompressed chunks, compression, format).
+    Only the first chunk is peeked at; everything stays a stream.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    compression = sniff_compression(first, content_encoding, key)
+    stream: Iterator[bytes] = itertools.chain([first], chunks)
+
+    if compression == "gzip":
+        stream = iter_gunzip(stream, chunk_size)
+    elif compression == "zstd":
+        stream = iter_unzstd(stream, chunk_size)
+
+    head = next(stream, b"")
+    return itertools.chain([head], stream), compression, sniff_format(head, key)
@@ -0,0 +1,8 @@
+"""
+Local load-test and benchmark harness for app.main.handler.
+
+    python -m benchmarks --rows 200000 --objects 20 --output bench.json
+    python -m benchmarks --events events.jsonl --baseline bench.json
+
+S3/DynamoDB are replaced by moto stand-ins (pip install moto).
+"""
@@ -0,0 +1,76 @@
+import argparse
+import sys
+
+import benchmarks
+from benchmarks.replay import aws_stand_ins, ensure_objects, load_events, run_events, synthetic_events
+from benchmarks.report import build_report, compare, load, save
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=benchmarks.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", help="JSONL file with one handler event per line (default: synthetic S3 events)")
+    parser.add_argument("--objects", type=int, default=10, help="synthetic S3 objects/events when --events is not given")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per synthetic CSV")
+    parser.add_argument("--dirty", type=float, default=0.0, help="share of rows with missing/invalid amount")
+    parser.add_argument("--columns", default="id,name,amount", help="CSV header layout")
+    parser.add_argument("--idempotency", action="store_true", help="use a moto DynamoDB idempotency table")
+    parser.add_argument("--result-cache", action="store_true", help="keep the warm-container result cache on (replays)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="previous JSON report: exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    columns = args.columns.split(",")
+
+    from app.config import settings
+    from app.logger import configure_logging
+    from app.result_cache import cache_stats, clear_cache
+
+    # Measure the pipeline, not stderr/stdout throughput
+    previous = settings.LOG_LEVEL, settings.METRICS_ENABLED, settings.RESULT_CACHE_SIZE
+    settings.LOG_LEVEL, settings.METRICS_ENABLED = "ERROR", False
+    if not args.result_cache:
+        settings.RESULT_CACHE_SIZE = 0
+    clear_cache()
+    configure_logging()
+    try:
+        with aws_stand_ins(idempotency_table=args.idempotency) as s3:
+            if args.events:
+                events = ensure_objects(s3, load_events(args.events), args.rows, args.dirty, columns)
+            else:
+                events = synthetic_events(s3, args.objects, args.rows, args.dirty, columns)
+            run = run_events(events)
+        cache = cache_stats()
+    finally:
+        settings.LOG_LEVEL, settings.METRICS_ENABLED, settings.RESULT_CACHE_SIZE = previous
+        configure_logging()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}
+    report = build_report(run, config)
+    if args.result_cache:
+        report["result_cache"] = cache
+    print(
+        f"events={report['events']} errors={report['errors']} rows={report['rows']} "
+        f"p50={report['latency_ms']['p50']}ms p99={report['latency_ms']['p99']}ms "
+        f"rows/s={report['rows_per_sec']} peak_rss={report['peak_rss_mb']}MB "
+        f"import={report['import_time_ms']}ms"
+    )
+
+    if args.output:
+        save(report, args.output)
+
+    if args.baseline:
+        regressions = compare(report, load(args.baseline), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+from benchmarks.synthetic import generate_csv, s3_event
+
+BUCKET = "bench-bucket"
+TABLE = "bench-idempotency"
+
+
+def load_events(path: str) -> List[dict]:
+    """One handler event per line (S3 notifications, SQS batches, custom events)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@contextmanager
+def aws_stand_ins(idempotency_table: bool = False) -> Iterator[object]:
+    """moto-backed S3 (and DynamoDB) wired into app.clients for the duration."""
+    try:
+        import moto
+    except ImportError:
+        raise SystemExit("The benchmark harness needs moto: pip install moto")
+
+    for name, value in {
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+    }.items():
+        os.environ.setdefault(name, value)
+
+    from app import clients, idempotency
+
+    previous_table = idempotency.IDEMPOTENCY_TABLE
+    with moto.mock_aws():
+        clients.reset_clients()
+        s3 = clients.get_client("s3")
+        s3.create_bucket(Bucket=BUCKET)
+        if idempotency_table:
+            clients.get_client("dynamodb").create_table(
+                TableName=TABLE,
+                KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+                BillingMode="PAY_PER_REQUEST",
+            )
+        idempotency.IDEMPOTENCY_TABLE = TABLE if idempotency_table else ""
+        idempotency.done_cache.clear()
+        try:
+            yield s3
+        finally:
+            idempotency.IDEMPOTENCY_TABLE = previous_table
+            idempotency.done_cache.clear()
+            clients.reset_clients()
+
+
+def upload_csv(s3, key: str, rows: int, dirty_ratio: float, columns: Optional[List[str]], seed: int) -> str:
+    buf = io.BytesIO()
+    generate_csv(buf, rows, dirty_ratio=dirty_ratio, columns=columns, seed=seed)
+    response = s3.put_object(Bucket=BUCKET, Key=key, Body=buf.getvalue())
+    return response["ETag"].strip('"')
+
+
+def synthetic_events(s3, objects: int, rows: int, dirty_ratio: float, columns: Optional[List[str]]) -> List[dict]:
+    events = []
+    for i in range(objects):
+        key = f"synthetic/{i:05d}.csv"
+        etag = upload_csv(s3, key, rows, dirty_ratio, columns, seed=i)
+        events.append(s3_event(BUCKET, key, etag))
+    return events
+
+
+def ensure_objects(s3, events: List[dict], rows: int, dirty_ratio: float, columns: Optional[List[str]]) -> List[dict]:
+    """
+    Replayed S3 notifications point at objects that don't exist locally:
+    upload a synthetic CSV for each key and redirect them to the bench bucket.
+    """
+    from app.S3_processor import is_s3_event, parse_s3_records
+
+    uploaded: Dict[str, str] = {}
+    for event in events:
+        if not is_s3_event(event):
+            continue
+        for info in parse_s3_records(event):
+            if info.get("key") and info["key"] not in uploaded:
+                uploaded[info["key"]] = upload_csv(s3, info["key"], rows, dirty_ratio, columns, seed=len(uploaded))
+
+    for event in events:
+        _redirect_bucket(event)
+    return events
+
+
+def _redirect_bucket(obj: object) -> None:
+    if isinstance(obj, list):
+        for value in obj:
+            _redirect_bucket(value)
+        return
+    if not isinstance(obj, dict):
+        return
+
+    if isinstance(obj.get("s3"), dict) and "bucket" in obj["s3"]:
+        obj["s3"]["bucket"]["name"] = BUCKET
+    for name, value in obj.items():
+        if name in ("body", "Message") and isinstance(value, str):
+            # SQS bodies / SNS messages embed the notification as a JSON string
+            try:
+                inner = json.loads(value)
+            except ValueError:
+                continue
+            _redirect_bucket(inner)
+            obj[name] = json.dumps(inner)
+        else:
+            _redirect_bucket(value)
+
+
+def run_events(events: List[dict]) -> Dict[str, object]:
+    """Invokes the handler once per event and collects latencies and rows."""
+    from app.main import handler
+
+    class Context:
+        aws_request_id = "bench"
+
+    latencies: List[float] = []
+    rows = 0
+    errors = 0
+    started = time.perf_counter()
+
+    for event in events:
+        start = time.perf_counter()
+        try:
+            response = handler(event, Context())
+        except Exception:
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        if response.get("statusCode", 500) >= 400:
+            errors += 1
+        for result in response.get("results") or []:
+            rows += int(result.get("rows") or 0)
+
+    return {
+        "latencies_ms": latencies,
+        "rows": rows,
+        "errors": errors,
+        "wall_seconds": time.perf_counter() - started,
+    }
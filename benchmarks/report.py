@@ -0,0 +1,108 @@
+import json
+import math
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# metric path -> which direction is better
+REGRESSION_CHECKS = {
+    "latency_ms.p50": "lower",
+    "latency_ms.p99": "lower",
+    "rows_per_sec": "higher",
+    "peak_rss_mb": "lower",
+    "import_time_ms": "lower",
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    # nearest-rank
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def import_time_ms(module: str = "app.main", runs: int = 3) -> float:
+    """Cold `import app.main` in a fresh interpreter (best of `runs`)."""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        match = re.search(rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$", proc.stderr, re.MULTILINE)
+        if match:
+            value = int(match.group(1)) / 1000
+            best = value if best is None else min(best, value)
+    return best or 0.0
+
+
+def build_report(run: Dict[str, object], config: Dict[str, object]) -> Dict[str, object]:
+    latencies = run["latencies_ms"]
+    wall = run["wall_seconds"] or 1e-9
+    return {
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "config": config,
+        "events": len(latencies),
+        "errors": run["errors"],
+        "rows": run["rows"],
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "rows_per_sec": round(run["rows"] / wall, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "import_time_ms": round(import_time_ms(), 2),
+    }
+
+
+def _lookup(report: Dict[str, object], path: str) -> float:
+    value: object = report
+    for part in path.split("."):
+        value = value[part]
+    return float(value)
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], tolerance: float = 0.2) -> List[str]:
+    """Returns one message per metric that got worse than baseline by more than `tolerance`."""
+    regressions = []
+    for path, better in REGRESSION_CHECKS.items():
+        try:
+            now, before = _lookup(current, path), _lookup(baseline, path)
+        except (KeyError, TypeError):
+            continue
+        if before <= 0:
+            continue
+        change = (now - before) / before
+        worse = change > tolerance if better == "lower" else -change > tolerance
+        if worse:
+            regressions.append(f"{path}: {before} -> {now} ({change:+.0%})")
+    return regressions
+
+
+def save(report: Dict[str, object], path: str) -> None:
+    Path(path).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+
+def load(path: str) -> Dict[str, object]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
@@ -0,0 +1,61 @@
+import random
+from typing import IO, List, Optional
+
+
+def generate_csv(
+    out: IO[bytes],
+    rows: int,
+    dirty_ratio: float = 0.0,
+    columns: Optional[List[str]] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Writes a synthetic CSV to `out` and returns the expected total amount.
+
+    columns: header layout; must contain "amount" (any case/padding), the other
+             columns get filler values. Default: id,name,amount.
+    dirty_ratio: share of rows with a missing or non-numeric amount.
+    """
+    columns = columns or ["id", "name", "amount"]
+    amount_index = [c.strip().lower() for c in columns].index("amount")
+    rng = random.Random(seed)
+    total = 0
+
+    out.write((",".join(columns) + "\n").encode("utf-8"))
+    lines = []
+    for i in range(rows):
+        values = [f"{c.strip().lower()}{i}" for c in columns]
+        values[0] = str(i)
+        if rng.random() < dirty_ratio:
+            if rng.random() < 0.5:
+                values[amount_index] = "n/a"
+            elif amount_index:
+                values = values[:amount_index]
+            else:
+                # Truncating before the first column would leave an empty line,
+                # which isn't a row at all
+                values[amount_index] = ""
+        else:
+            amount = rng.randint(0, 1000)
+            values[amount_index] = str(amount)
+            total += amount
+        lines.append(",".join(values))
+
+        if len(lines) >= 10_000:
+            out.write(("\n".join(lines) + "\n").encode("utf-8"))
+            lines = []
+
+    if lines:
+        out.write(("\n".join(lines) + "\n").encode("utf-8"))
+    return total
+
+
+def s3_event(bucket: str, key: str, etag: str) -> dict:
+    return {
+        "Records": [
+            {
+                "eventSource": "aws:s3",
+                "s3": {"bucket": {"name": bucket}, "object": {"key": key, "eTag": etag}},
+            }
+        ]
+    }
@@ -1,5 +1,24 @@
-from pathlib import Path
+"""
+Builds lambda.zip: the Lambda wrapper at the root of the zip and the app/ package.
+
+    python build_lambda_zip.py
+    python build_lambda_zip.py --compile --python 3.11 --report
+    python build_lambda_zip.py --requirements requirements-lambda.txt --report
+
+Builds are reproducible: entries are sorted and get fixed timestamps and
+permissions, so the same sources always produce the same bytes (and hash).
+"""
+import argparse
+import fnmatch
+import os
+import py_compile
+import re
+import subprocess
+import sys
+import tempfile
 import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 ROOT = Path(__file__).parent
 OUT = ROOT / "lambda.zip"
@@ -8,30 +27,260 @@ OUT = ROOT / "lambda.zip"
 APP_DIR = ROOT / "app"
 WRAPPER_DIR = ROOT / "lambda_wrapper"  # solo contiene main.py
 
-def add_folder(z: zipfile.ZipFile, folder: Path, base_in_zip: str = ""):
+# Earliest date a zip entry can hold: no build time leaks into the artifact
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+FILE_MODE = 0o644
+
+# Never shipped: caches, bytecode of the build machine, editor leftovers
+EXCLUDE_DIRS = {"__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache", ".git", ".idea", ".vscode"}
+EXCLUDE_PATTERNS = ["*.pyc", "*.pyo", "*.orig", "*.rej", "*.swp", "*~", ".DS_Store", "Thumbs.db"]
+
+# Pruned from vendored dependencies (not from app/)
+VENDOR_EXCLUDE_DIRS = {"tests", "test", "testing", "docs", "examples", "benchmarks"}
+VENDOR_EXCLUDE_PATTERNS = ["*.pyi", "*.c", "*.h", "*.pyx", "*.pxd"]
+# Only what importlib.metadata needs (and licenses) is kept from *.dist-info
+DIST_INFO_KEEP = ["METADATA", "LICENSE*", "LICENCE*", "COPYING*", "NOTICE*", "licenses"]
+
+NATIVE_SUFFIXES = (".so", ".pyd", ".dylib")
+
+
+def _excluded(rel: Path, dirs: Iterable[str], patterns: Sequence[str]) -> bool:
+    if any(part in dirs for part in rel.parts[:-1]):
+        return True
+    return any(fnmatch.fnmatch(rel.name, p) or fnmatch.fnmatch(rel.as_posix(), p) for p in patterns)
+
+
+def _in_dist_info(rel: Path) -> bool:
+    return len(rel.parts) > 1 and rel.parts[0].endswith(".dist-info")
+
+
+def collect_files(
+    folder: Path,
+    base_in_zip: str = "",
+    exclude: Sequence[str] = (),
+    vendored: bool = False,
+) -> Dict[str, Path]:
+    """arcname -> file, after the exclusion rules (and dependency pruning if `vendored`)."""
+    dirs = set(EXCLUDE_DIRS)
+    patterns = list(EXCLUDE_PATTERNS) + list(exclude)
+    if vendored:
+        dirs |= VENDOR_EXCLUDE_DIRS
+        patterns += VENDOR_EXCLUDE_PATTERNS
+
+    files: Dict[str, Path] = {}
     for p in folder.rglob("*"):
         if p.is_dir():
             continue
-        rel = p.relative_to(folder).as_posix()
-        arcname = f"{base_in_zip}{rel}" if base_in_zip else rel
-        z.write(p, arcname)
+        rel = p.relative_to(folder)
+        if _excluded(rel, dirs, patterns):
+            continue
+        if vendored and _in_dist_info(rel):
+            inner = Path(*rel.parts[1:])
+            if not any(fnmatch.fnmatch(inner.parts[0], keep) for keep in DIST_INFO_KEEP):
+                continue
+        files[f"{base_in_zip}{rel.as_posix()}"] = p
+    return files
+
+
+def _write_entry(z: zipfile.ZipFile, arcname: str, data: bytes) -> None:
+    info = zipfile.ZipInfo(arcname, date_time=FIXED_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = (0o100000 | FILE_MODE) << 16
+    info.create_system = 3  # unix, whatever the build OS
+    z.writestr(info, data, compresslevel=9)
+
+
+def check_python(target: Optional[str]) -> str:
+    """The bytecode format is version specific: .pyc must come from the target Python."""
+    current = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if target and target != current:
+        raise SystemExit(
+            f"--compile needs the target Python: running {current}, target {target} "
+            f"(run this script with python{target})"
+        )
+    return current
+
+
+def compile_pyc(source: Path, arcname: str) -> Optional[Tuple[str, bytes]]:
+    """
+    Bytecode for `source` in the __pycache__ location of the running Python.
+    unchecked-hash pycs are deterministic and never compared to the source
+    mtime, so Lambda's read-only /var/task doesn't recompile them on cold start.
+    Returns (arcname of the .pyc, bytes), or None if the file doesn't compile.
+    """
+    cache_name = Path(arcname).parent / "__pycache__" / f"{Path(arcname).stem}.{sys.implementation.cache_tag}.pyc"
+    with tempfile.TemporaryDirectory() as tmp:
+        cfile = Path(tmp) / "out.pyc"
+        try:
+            py_compile.compile(
+                str(source),
+                cfile=str(cfile),
+                dfile=arcname,
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+        except py_compile.PyCompileError as e:
+            print(f"warning: not compiled {arcname}: {e.msg.strip().splitlines()[-1]}", file=sys.stderr)
+            return None
+        return cache_name.as_posix(), cfile.read_bytes()
 
-def build_zip():
+
+def install_requirements(requirements: Path, target: Path) -> None:
+    """pip install --target (no compile: bytecode is added by --compile for the target Python)."""
+    subprocess.run(
+        [
+            sys.executable, "-m", "pip", "install",
+            "--quiet", "--no-compile", "--no-warn-script-location",
+            "--target", str(target),
+            "-r", str(requirements),
+        ],
+        check=True,
+    )
+
+
+def check_pure_python(files: Dict[str, Path]) -> None:
+    native = sorted(name for name in files if name.endswith(NATIVE_SUFFIXES))
+    if native:
+        raise SystemExit(
+            "Vendored dependencies must be pure Python (native code is built for the "
+            f"build machine, not for Lambda): {', '.join(native[:5])}"
+        )
+
+
+def build_zip(
+    out: Path = OUT,
+    precompile: bool = False,
+    python: Optional[str] = None,
+    vendor_dir: Optional[Path] = None,
+    exclude: Sequence[str] = (),
+) -> Path:
     if not APP_DIR.exists():
         raise FileNotFoundError(f"Missing {APP_DIR}")
     if not (WRAPPER_DIR / "main.py").exists():
         raise FileNotFoundError("Missing lambda_wrapper/main.py")
+    if precompile:
+        check_python(python)
+
+    files: Dict[str, Path] = {}
+    if vendor_dir is not None:
+        vendored = collect_files(vendor_dir, exclude=exclude, vendored=True)
+        check_pure_python(vendored)
+        # bin/ holds console scripts, useless inside Lambda
+        files.update({name: path for name, path in vendored.items() if not name.startswith("bin/")})
+    # wrapper main.py goes to root of zip
+    files["main.py"] = WRAPPER_DIR / "main.py"
+    # app package goes into app/ in zip
+    files.update(collect_files(APP_DIR, base_in_zip="app/", exclude=exclude))
+
+    entries: Dict[str, bytes] = {name: path.read_bytes() for name, path in files.items()}
+    if precompile:
+        for name, path in files.items():
+            if name.endswith(".py"):
+                compiled = compile_pyc(path, name)
+                if compiled is not None:
+                    entries[compiled[0]] = compiled[1]
+
+    if out.exists():
+        out.unlink()
+
+    with zipfile.ZipFile(out, "w") as z:
+        for arcname in sorted(entries):
+            _write_entry(z, arcname, entries[arcname])
+
+    print(f"Built {out}")
+    return out
+
+
+def import_time_us(zip_path: Path, module: str = "main") -> int:
+    """
+    Cold-start import time of `module` from the unpacked zip, as Lambda
+    runs it: read-only code (no bytecode written), fresh interpreter.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        with zipfile.ZipFile(zip_path) as z:
+            z.extractall(tmp)
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONPATH": tmp}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=tmp,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    pattern = re.compile(rf"^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*{re.escape(module)}$")
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1))
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def size_report(zip_path: Path, top: int = 10) -> Dict[str, object]:
+    with zipfile.ZipFile(zip_path) as z:
+        infos = z.infolist()
+
+    groups: Dict[str, List[int]] = {}
+    for info in infos:
+        parts = info.filename.split("/")
+        group = "/".join(parts[:2]) if parts[0] == "app" and len(parts) > 2 else parts[0]
+        sizes = groups.setdefault(group, [0, 0])
+        sizes[0] += info.compress_size
+        sizes[1] += info.file_size
+
+    largest = sorted(groups.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "zip_bytes": zip_path.stat().st_size,
+        "uncompressed_bytes": sum(info.file_size for info in infos),
+        "files": len(infos),
+        "pyc_files": sum(1 for info in infos if info.filename.endswith(".pyc")),
+        "largest": [{"path": name, "compressed": c, "uncompressed": u} for name, (c, u) in largest],
+    }
+
+
+def print_report(zip_path: Path, measure_import: bool = True) -> None:
+    report = size_report(zip_path)
+    print(
+        f"Size: {report['zip_bytes'] / 1024:.1f} KiB zipped, "
+        f"{report['uncompressed_bytes'] / 1024:.1f} KiB unpacked, "
+        f"{report['files']} files ({report['pyc_files']} .pyc)"
+    )
+    for entry in report["largest"]:
+        print(f"  {entry['compressed'] / 1024:8.1f} KiB  {entry['path']}")
+    if measure_import:
+        print(f"Import time (main): {import_time_us(zip_path) / 1000:.1f} ms")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=OUT, help="zip to write (default: lambda.zip)")
+    parser.add_argument("--compile", action="store_true", help="add __pycache__ bytecode for the target Python")
+    parser.add_argument("--python", help="target Python version, e.g. 3.11 (must match the interpreter running this)")
+    parser.add_argument("--exclude", action="append", default=[], help="extra glob to leave out (repeatable)")
+    vendor = parser.add_mutually_exclusive_group()
+    vendor.add_argument("--requirements", type=Path, help="pip install these pure-Python deps into the zip")
+    vendor.add_argument("--vendor-dir", type=Path, help="already installed deps (pip install --target) to bundle")
+    parser.add_argument("--report", action="store_true", help="print size and import-time report")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vendor_dir = args.vendor_dir
+        if args.requirements is not None:
+            vendor_dir = Path(tmp) / "vendor"
+            install_requirements(args.requirements, vendor_dir)
 
-    if OUT.exists():
-        OUT.unlink()
+        out = build_zip(
+            out=args.output,
+            precompile=args.compile,
+            python=args.python,
+            vendor_dir=vendor_dir,
+            exclude=args.exclude,
+        )
 
-    with zipfile.ZipFile(OUT, "w", compression=zipfile.ZIP_DEFLATED) as z:
-        # wrapper main.py goes to root of zip
-        z.write((WRAPPER_DIR / "main.py"), "main.py")
-        # app package goes into app/ in zip
-        add_folder(z, APP_DIR, base_in_zip="app/")
+    if args.report:
+        print_report(out)
+    return 0
 
-    print(f"Built {OUT}")
 
 if __name__ == "__main__":
-    build_zip()
+    raise SystemExit(main())
@@ -0,0 +1,6 @@
+import os
+
+# boto3 needs a region (and moto needs fake credentials) to build clients
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
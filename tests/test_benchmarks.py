@@ -0,0 +1,85 @@
+import io
+import json
+
+import pytest
+
+from app.csv_engine import aggregate_csv
+from benchmarks.__main__ import main
+from benchmarks.report import compare, percentile
+from benchmarks.synthetic import generate_csv
+
+
+@pytest.mark.parametrize("columns", [["ID", " Amount ", "name"], ["amount", "id"]])
+def test_generate_csv_total_matches_engine(columns):
+    buf = io.BytesIO()
+    total = generate_csv(buf, rows=5000, dirty_ratio=0.1, columns=columns, seed=3)
+
+    stats = aggregate_csv(io.StringIO(buf.getvalue().decode("utf-8")))
+
+    assert stats.total == total
+    assert stats.rows == 5000
+    assert 300 < stats.bad_rows < 700
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"latency_ms": {"p50": 10, "p99": 20}, "rows_per_sec": 1000, "peak_rss_mb": 100, "import_time_ms": 40}
+    current = {"latency_ms": {"p50": 11, "p99": 30}, "rows_per_sec": 700, "peak_rss_mb": 100, "import_time_ms": 40}
+
+    regressions = compare(current, baseline, tolerance=0.2)
+
+    assert [r.split(":")[0] for r in regressions] == ["latency_ms.p99", "rows_per_sec"]
+
+
+def test_percentile():
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0.0
+
+
+def test_replay_event_stream_against_moto(tmp_path, capsys):
+    pytest.importorskip("moto")
+    s3_notification = {"Records": [{"s3": {"bucket": {"name": "prod"}, "object": {"key": "a.csv", "eTag": "1"}}}]}
+    events = [
+        s3_notification,
+        {"Records": [{"eventSource": "aws:sqs", "messageId": "m1", "body": json.dumps(s3_notification)}]},
+        {"source": "ecommerce.orders", "type": "OrderCreated", "payload": {"order_id": 1, "amount": 5}},
+    ]
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(json.dumps(e) for e in events) + "\n")
+    output = tmp_path / "report.json"
+
+    assert main(["--events", str(path), "--rows", "100", "--idempotency", "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    assert report["events"] == 3 and report["errors"] == 0
+    # The SQS re-drive of the same object is skipped by idempotency
+    assert report["rows"] == 100
+    assert set(report["latency_ms"]) == {"p50", "p99", "mean", "max"}
+    assert report["peak_rss_mb"] > 0 and report["import_time_ms"] > 0
+
+
+def test_run_events_counts_a_raising_handler_once(monkeypatch):
+    import app.main
+    from benchmarks.replay import run_events
+
+    def handler(event, context):
+        if event.get("fail"):
+            raise RuntimeError("S3BatchError")
+        return {"statusCode": 200, "results": [{"rows": 2}]}
+
+    monkeypatch.setattr(app.main, "handler", handler)
+    result = run_events([{"fail": True}, {}])
+
+    assert (result["errors"], result["rows"], len(result["latencies_ms"])) == (1, 2, 2)
+
+
+def test_events_bench_reports_both_variants():
+    from benchmarks.events_bench import run
+
+    result = run(400)
+
+    assert result["events"] == 400
+    assert result["legacy_events_per_sec"] > 0
+    assert result["registry_events_per_sec"] > 0
@@ -0,0 +1,80 @@
+import hashlib
+import sys
+import zipfile
+
+import pytest
+
+import build_lambda_zip
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    app = tmp_path / "src" / "app"
+    (app / "__pycache__").mkdir(parents=True)
+    (app / "__init__.py").write_text("")
+    (app / "main.py").write_text("def handler(event, context):\n    return 'ok'\n")
+    (app / "__pycache__" / "main.cpython-311.pyc").write_bytes(b"stale")
+    (app / ".DS_Store").write_bytes(b"junk")
+    (app / "notes.swp").write_bytes(b"junk")
+    wrapper = tmp_path / "src" / "lambda_wrapper"
+    wrapper.mkdir()
+    (wrapper / "main.py").write_text("from app.main import handler\n")
+
+    monkeypatch.setattr(build_lambda_zip, "APP_DIR", app)
+    monkeypatch.setattr(build_lambda_zip, "WRAPPER_DIR", wrapper)
+    return tmp_path
+
+
+def names(path):
+    with zipfile.ZipFile(path) as z:
+        return z.namelist()
+
+
+def test_build_is_deterministic_and_excludes_caches(sources):
+    first = build_lambda_zip.build_zip(out=sources / "a.zip")
+    # Newer mtimes must not change the artifact
+    (build_lambda_zip.APP_DIR / "main.py").touch()
+    second = build_lambda_zip.build_zip(out=sources / "b.zip")
+
+    assert hashlib.sha256(first.read_bytes()).digest() == hashlib.sha256(second.read_bytes()).digest()
+    assert names(first) == ["app/__init__.py", "app/main.py", "main.py"]
+    with zipfile.ZipFile(first) as z:
+        assert {info.date_time for info in z.infolist()} == {build_lambda_zip.FIXED_DATE_TIME}
+
+
+def test_compile_adds_unchecked_hash_pyc_for_running_python(sources):
+    out = build_lambda_zip.build_zip(out=sources / "c.zip", precompile=True)
+
+    pyc = f"app/__pycache__/main.{sys.implementation.cache_tag}.pyc"
+    assert pyc in names(out)
+    with zipfile.ZipFile(out) as z:
+        # PEP 552 flags: 0b01 = hash-based, 0b10 unset = unchecked
+        assert int.from_bytes(z.read(pyc)[4:8], "little") == 0b01
+
+    with pytest.raises(SystemExit):
+        build_lambda_zip.build_zip(out=sources / "d.zip", precompile=True, python="2.7")
+
+
+def test_vendored_deps_are_pruned_and_must_be_pure_python(sources):
+    vendor = sources / "vendor"
+    (vendor / "dep" / "tests").mkdir(parents=True)
+    (vendor / "dep" / "__init__.py").write_text("")
+    (vendor / "dep" / "__init__.pyi").write_text("")
+    (vendor / "dep" / "tests" / "test_dep.py").write_text("")
+    (vendor / "dep-1.0.dist-info").mkdir()
+    for name in ("METADATA", "RECORD", "INSTALLER", "LICENSE"):
+        (vendor / "dep-1.0.dist-info" / name).write_text("")
+    (vendor / "bin").mkdir()
+    (vendor / "bin" / "dep-cli").write_text("")
+
+    out = build_lambda_zip.build_zip(out=sources / "e.zip", vendor_dir=vendor)
+
+    assert [n for n in names(out) if not n.startswith(("app/", "main.py"))] == [
+        "dep-1.0.dist-info/LICENSE",
+        "dep-1.0.dist-info/METADATA",
+        "dep/__init__.py",
+    ]
+
+    (vendor / "dep" / "_speedups.cpython-311-x86_64-linux-gnu.so").write_bytes(b"")
+    with pytest.raises(SystemExit):
+        build_lambda_zip.build_zip(out=sources / "f.zip", vendor_dir=vendor)
@@ -0,0 +1,38 @@
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Budget for `import app.main` (cumulative, microseconds). Locally it's ~40 ms;
+# importing boto3 alone at module level adds ~200 ms.
+IMPORT_BUDGET_US = 120_000
+
+
+def import_app_main():
+    code = "import sys, app.main; print(sorted(m for m in sys.modules if m.split('.')[0] in ('boto3', 'botocore')))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| app\.main$", proc.stderr, re.MULTILINE)
+    assert match, proc.stderr[-2000:]
+    return int(match.group(1)), proc.stdout.strip()
+
+
+def test_importing_handler_does_not_load_boto3():
+    _, aws_modules = import_app_main()
+
+    assert aws_modules == "[]"
+
+
+def test_cold_start_import_time_benchmark():
+    # Best of 3 to smooth out noisy CI machines
+    cumulative_us = min(import_app_main()[0] for _ in range(3))
+
+    print(f"\nimport app.main: {cumulative_us / 1000:.1f} ms")
+    assert cumulative_us < IMPORT_BUDGET_US
@@ -0,0 +1,136 @@
+import io
+import json
+
+import pytest
+
+from app import clients, idempotency
+from app.columnar import ColumnarWriter, read_columnar, sum_columnar_amount
+from app.config import settings
+from app.csv_engine import aggregate_csv, aggregate_ndjson
+from app.S3_processor import process_s3_object
+
+CONTENT = "ID, Amount ,Name\n1,10,Zoë\n2,abc,Bob\n3\n4,5\n5,7,Eve,extra\n"
+
+
+def test_columnar_writer_roundtrip_in_batches():
+    out = io.BytesIO()
+    writer = ColumnarWriter(out, batch_rows=2, fmt="columnar")
+
+    stats = aggregate_csv(io.StringIO(CONTENT), sink=writer)
+    writer.close()
+    out.seek(0)
+    batches = list(read_columnar(out))
+
+    assert stats.as_tuple() == aggregate_csv(io.StringIO(CONTENT)).as_tuple() == (22, 5)
+    assert writer.rows == 3 and writer.batches == 2
+    assert writer.schema() == [
+        {"name": "id", "type": "string"},
+        {"name": "amount", "type": "int64"},
+        {"name": "name", "type": "string"},
+    ]
+    assert [list(b["amount"]) for b in batches] == [[10, 5], [7]]
+    assert [b["name"] for b in batches] == [["Zoë", ""], ["Eve"]]
+
+
+def test_sum_columnar_amount_reads_only_amount():
+    out = io.BytesIO()
+    writer = ColumnarWriter(out, batch_rows=1000, fmt="columnar")
+    aggregate_csv(io.StringIO("id,amount\n" + "".join(f"{i},{i}\n" for i in range(5000))), sink=writer)
+    writer.close()
+    out.seek(0)
+
+    assert sum_columnar_amount(out) == sum(range(5000))
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "parquet"])
+def test_writer_without_clean_rows_writes_a_valid_empty_file(fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow.parquet")
+    out = io.BytesIO()
+    writer = ColumnarWriter(out, fmt=fmt)
+    # Every line bad: the sink is never started
+    aggregate_ndjson(io.StringIO('{"amount": "x"}\n{"id": 1}\n'), sink=writer)
+    writer.close()
+    out.seek(0)
+
+    assert writer.rows == 0 and writer.schema() == []
+    if fmt == "columnar":
+        assert list(read_columnar(out)) == []
+    else:
+        import pyarrow.parquet as pq
+
+        assert pq.read_table(out).num_rows == 0
+
+
+@pytest.mark.parametrize("fmt", ["columnar", "parquet"])
+def test_amounts_beyond_int64_are_left_out_of_the_output(fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow.parquet")
+    content = f"id,amount\n1,{2 ** 63}\n2,{-(2 ** 63)}\n3,{-(2 ** 63) - 1}\n"
+    out = io.BytesIO()
+    writer = ColumnarWriter(out, fmt=fmt)
+
+    stats = aggregate_csv(io.StringIO(content), sink=writer)
+    writer.close()
+    out.seek(0)
+
+    assert stats.as_tuple() == (-(2 ** 63) - 1, 3)
+    assert (writer.rows, writer.out_of_range) == (1, 2)
+    if fmt == "columnar":
+        assert sum_columnar_amount(out) == -(2 ** 63)
+    else:
+        import pyarrow.parquet as pq
+
+        assert pq.read_table(out).column("amount").to_pylist() == [-(2 ** 63)]
+
+
+def test_read_columnar_rejects_other_files():
+    with pytest.raises(ValueError):
+        list(read_columnar(io.BytesIO(b"id,amount\n")))
+
+
+def test_process_s3_object_writes_columnar_output(monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="raw")
+        s3.create_bucket(Bucket="curated")
+        s3.put_object(Bucket="raw", Key="in/orders.csv", Body=CONTENT.encode("utf-8"))
+        monkeypatch.setitem(clients._clients, "s3", s3)
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+        monkeypatch.setattr(settings, "OUTPUT_BUCKET", "curated")
+        monkeypatch.setattr(settings, "OUTPUT_PREFIX", "columnar/")
+        monkeypatch.setattr(settings, "OUTPUT_FORMAT", "columnar")
+
+        result = process_s3_object({"bucket": "raw", "key": "in/orders.csv", "etag": "e1"})
+
+        output = result["output"]
+        assert output == {
+            "bucket": "curated",
+            "data_key": "columnar/in/orders.csv.edcol",
+            "manifest_key": "columnar/in/orders.csv.manifest.json",
+        }
+        manifest = json.loads(s3.get_object(Bucket="curated", Key=output["manifest_key"])["Body"].read())
+        data = s3.get_object(Bucket="curated", Key=output["data_key"])["Body"].read()
+
+    assert manifest["source"] == {"bucket": "raw", "key": "in/orders.csv", "etag": "e1", "pk": result["pk"]}
+    assert (manifest["rows"], manifest["clean_rows"], manifest["total_amount"]) == (5, 3, 22)
+    assert (manifest["missing_amount_rows"], manifest["invalid_amount_rows"], manifest["out_of_range_rows"]) == (1, 1, 0)
+    assert sum_columnar_amount(io.BytesIO(data)) == result["total_amount"]
+
+
+def test_parquet_output_when_pyarrow_is_available():
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = io.BytesIO()
+    writer = ColumnarWriter(out, batch_rows=2, fmt="parquet")
+
+    aggregate_csv(io.StringIO(CONTENT), sink=writer)
+    writer.close()
+    out.seek(0)
+    table = pq.read_table(out)
+
+    assert writer.extension == "parquet"
+    assert table.to_pydict() == {"id": ["1", "4", "5"], "amount": [10, 5, 7], "name": ["Zoë", "", "Eve"]}
+    assert str(table.schema.field("amount").type) == "int64"
@@ -0,0 +1,89 @@
+import csv
+import io
+
+import pytest
+
+from app import csv_engine
+from app.csv_engine import CsvStats, aggregate_csv, aggregate_ndjson, find_amount_index
+
+
+def reference_sum(content: str):
+    """The original DictReader implementation, used as the semantic oracle"""
+    total = 0
+    rows = 0
+    for row in csv.DictReader(io.StringIO(content)):
+        rows += 1
+        row_norm = {k.strip().lower(): v for k, v in row.items() if k}
+        amount_str = row_norm.get("amount")
+        if amount_str is None:
+            continue
+        try:
+            total += int(str(amount_str).strip())
+        except ValueError:
+            continue
+    return total, rows
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "",
+        "id,name,amount\n",
+        "id,name,amount\n1,Alice,10\n2,Bob,20\n",
+        "ID, Amount ,name\n1, 7 ,a\n2,,b\n3\n\n4,x,c\n5,+3,d,extra\n",
+        "id,name\n1,a\n2,b\n",
+        "amount,Amount\n1,2\n3\n",
+        "id,amount\r\n1,\"1_000\"\r\n2,\" 4\"\r\n3,4.5\r\n",
+        "\nid,amount\n1,2\n",
+        "id,amount\n" + "".join(f"{i},{i if i % 97 else 'bad'}\n" for i in range(10_000)),
+    ],
+)
+def test_aggregate_csv_matches_dictreader_semantics(content):
+    assert aggregate_csv(io.StringIO(content)).as_tuple() == reference_sum(content)
+
+
+def test_aggregate_csv_counts_bad_rows():
+    stats = aggregate_csv(io.StringIO("id,amount\n1,10\n2\n3,abc\n4,\n5,5\n"))
+
+    assert stats == CsvStats(total=15, rows=5, missing=1, invalid=2)
+
+
+def test_aggregate_csv_continues_existing_stats():
+    stats = aggregate_csv(io.StringIO("amount\n1\n2\n"))
+    aggregate_csv(io.StringIO("amount\n3\n"), stats)
+
+    assert stats.as_tuple() == (6, 3)
+
+
+def test_find_amount_index_normalizes_header_once():
+    assert find_amount_index(["id", " Amount ", "name"]) == 1
+    assert find_amount_index(["amount", "AMOUNT"]) == 1
+    assert find_amount_index(["id", ""]) is None
+
+
+def test_bad_row_warnings_are_rate_limited(monkeypatch):
+    messages = []
+    monkeypatch.setattr(csv_engine.logger, "warning", lambda msg, *args: messages.append(msg % args))
+    content = "id,amount\n" + "".join(f"{i},bad\n" for i in range(1000))
+
+    stats = aggregate_csv(io.StringIO(content))
+
+    assert stats.invalid == 1000
+    assert len(messages) == csv_engine.MAX_ROW_WARNINGS + 1
+    assert "invalid_amount=1000" in messages[-1]
+
+
+def test_aggregate_ndjson_same_contract_as_csv():
+    lines = [
+        '{"id": 1, " Amount ": 10}\n',
+        "\n",
+        '{"id": 2, "amount": " 7 "}\n',
+        '{"id": 3, "amount": true}\n',
+        '{"id": 4}\n',
+        "not json\n",
+        "[1, 2]\n",
+    ]
+
+    stats = aggregate_ndjson(lines)
+
+    assert stats == CsvStats(total=17, rows=6, missing=1, invalid=3)
@@ -1,6 +1,9 @@
+import json
+
 import pytest
-from app.events import validate_event, EventValidationError
+from app.events import EVENT_HANDLERS, NUMBER, PAYLOAD_VALIDATORS, register_event, validate_event, EventValidationError
 from app.main import handler
+from app.S3_processor import is_s3_event
 
 
 def test_valid_event_passes():
@@ -62,3 +65,106 @@ def test_handler_event_without_registered_handler():
 
     assert response["statusCode"] == 400
 
+
+
+def test_payload_schema_rejects_bool_for_int():
+    event = {
+        "source": "test",
+        "type": "UserRegistered",
+        "payload": {"user_id": True},
+    }
+
+    with pytest.raises(EventValidationError, match="user_id"):
+        validate_event(event)
+
+
+def test_handler_invalid_payload_returns_400():
+    event = {
+        "source": "test",
+        "type": "OrderCreated",
+        "payload": {"order_id": "123"},
+    }
+
+    response = handler(event, None)
+
+    assert response["statusCode"] == 400
+    assert "order_id" in response["body"]
+
+
+def test_register_event_compiles_schema_and_rejects_duplicates():
+    @register_event("TestOnlyEvent", schema={"value": NUMBER})
+    def handle_test_only(payload: dict) -> None:
+        pass
+
+    try:
+        event = {"source": "test", "type": "TestOnlyEvent", "payload": {"value": 1.5}}
+        assert validate_event(event) is handle_test_only
+
+        with pytest.raises(EventValidationError, match="missing 'value'"):
+            validate_event({**event, "payload": {}})
+
+        with pytest.raises(ValueError):
+            register_event("TestOnlyEvent")(handle_test_only)
+    finally:
+        EVENT_HANDLERS.pop("TestOnlyEvent")
+        PAYLOAD_VALIDATORS.pop("TestOnlyEvent")
+
+
+def sqs_event(*bodies) -> dict:
+    return {
+        "Records": [
+            {"eventSource": "aws:sqs", "messageId": f"m{i}", "body": body if isinstance(body, str) else json.dumps(body)}
+            for i, body in enumerate(bodies)
+        ]
+    }
+
+
+def test_is_s3_event_ignores_sqs_batches_of_custom_events():
+    custom = sqs_event({"source": "test", "type": "UserRegistered", "payload": {"user_id": 1}})
+    s3 = sqs_event({"Records": [{"s3": {"bucket": {"name": "b"}, "object": {"key": "k"}}}]})
+
+    assert not is_s3_event(custom)
+    assert is_s3_event(s3)
+
+
+def test_handler_sqs_batch_reports_per_item_status(monkeypatch):
+    calls = []
+
+    def failing_user_handler(payload):
+        if payload["user_id"] == 2:
+            raise RuntimeError("boom")
+
+    monkeypatch.setitem(EVENT_HANDLERS, "UserRegistered", failing_user_handler)
+    monkeypatch.setitem(EVENT_HANDLERS, "OrderCreated", calls.append)
+    event = sqs_event(
+        {"source": "test", "type": "OrderCreated", "payload": {"order_id": 1, "amount": 5}},
+        {"source": "test", "type": "UserRegistered", "payload": {"user_id": 2}},
+        {"source": "test", "type": "OrderCreated", "payload": {"order_id": 2, "amount": 7.5}},
+        {"source": "test", "type": "PaymentFailed", "payload": {}},
+        "not json",
+    )
+
+    response = handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert [r["status"] for r in response["results"]] == ["ok", "failed", "ok", "invalid", "invalid"]
+    # Invalid items are not retried, only the failed one
+    assert response["batchItemFailures"] == [{"itemIdentifier": "m1"}]
+    # OrderCreated is a batch handler: one call with both payloads
+    assert calls == [[{"order_id": 1, "amount": 5}, {"order_id": 2, "amount": 7.5}]]
+
+
+def test_handler_accepts_lists_and_eventbridge_envelopes():
+    envelope = {
+        "id": "eb-1",
+        "source": "ecommerce.users",
+        "detail-type": "UserRegistered",
+        "detail": {"user_id": 3},
+    }
+
+    assert handler(envelope, None)["statusCode"] == 200
+
+    response = handler([envelope, {"source": "test", "type": "OrderCreated", "payload": {"order_id": 1, "amount": 2}}], None)
+
+    assert [(r["item_id"], r["status"]) for r in response["results"]] == [("eb-1", "ok"), ("1", "ok")]
+    assert response["batchItemFailures"] == []
@@ -0,0 +1,140 @@
+import pytest
+
+from app import clients, idempotency
+from app.cache import TTLCache
+from app.csv_engine import CsvStats
+from app.idempotency import (
+    Checkpoint,
+    ClaimLostError,
+    claim_many,
+    claim_once,
+    mark_done,
+    mark_done_many,
+    reclaim_stale,
+    save_checkpoint,
+)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("dynamodb", region_name="us-east-1")
+        client.create_table(
+            TableName="idempotency",
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setitem(clients._clients, "dynamodb", client)
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "idempotency")
+        idempotency.done_cache.clear()
+        idempotency.resumable_claims.clear()
+        yield client
+        idempotency.done_cache.clear()
+        idempotency.resumable_claims.clear()
+
+
+def status(client, pk):
+    item = client.get_item(TableName="idempotency", Key={"pk": {"S": pk}})["Item"]
+    return item["status"]["S"]
+
+
+def test_claim_once_conditional_put(table):
+    assert claim_once("b#k#1") is True
+    assert claim_once("b#k#1") is False
+
+
+def test_claim_many_skips_existing_and_repeated_pks(table):
+    assert claim_once("b#old#1") is True
+
+    claims = claim_many(["b#a#1", "b#old#1", "b#c#1", "b#a#1"])
+
+    assert claims == [True, False, True, False]
+    assert status(table, "b#a#1") == "PROCESSING"
+    assert status(table, "b#c#1") == "PROCESSING"
+
+
+def test_mark_done_many_and_cache_short_circuits(table, monkeypatch):
+    claim_many(["b#a#1", "b#b#1"])
+    mark_done_many(["b#a#1", "b#b#1"])
+    assert status(table, "b#a#1") == "DONE"
+    assert status(table, "b#b#1") == "DONE"
+
+    def no_network(**kwargs):
+        raise AssertionError("cached DONE pk must not reach DynamoDB")
+
+    monkeypatch.setattr(table, "put_item", no_network)
+    monkeypatch.setattr(table, "transact_write_items", no_network)
+
+    assert claim_once("b#a#1") is False
+    assert claim_many(["b#a#1", "b#b#1"]) == [False, False]
+
+
+def test_mark_done_populates_cache(table):
+    claim_once("b#k#1")
+    mark_done("b#k#1")
+
+    assert "b#k#1" in idempotency.done_cache
+
+
+def test_claim_many_without_table(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+
+    assert claim_many(["a", "a"]) == [True, True]
+
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(max_size=2, ttl_seconds=10, clock=lambda: now[0])
+
+    cache.set("a")
+    cache.set("b")
+    cache.get("a")
+    cache.set("c")  # evicts least recently used "b"
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+    now[0] = 11
+    assert "a" not in cache
+
+
+def test_reclaim_stale_returns_checkpoint_and_fences_old_claim(table, monkeypatch):
+    monkeypatch.setattr(idempotency.settings, "CHECKPOINT_BYTES", 1024)
+    assert claim_once("b#big#1") is True
+    first = Checkpoint(offset=100, header="id,amount\n", stats=CsvStats(total=7, rows=3, invalid=1))
+    save_checkpoint("b#big#1", first)
+
+    # Heartbeat is fresh: not stale yet
+    assert claim_once("b#big#1") is False
+    assert reclaim_stale("b#big#1", stale_seconds=300) is None
+
+    resumed = reclaim_stale("b#big#1", stale_seconds=-1)
+
+    assert resumed == Checkpoint(attempt=1, offset=100, header="id,amount\n", stats=CsvStats(total=7, rows=3, invalid=1))
+    # The old invocation can't overwrite the progress of the new one
+    with pytest.raises(ClaimLostError):
+        save_checkpoint("b#big#1", first)
+
+    mark_done("b#big#1")
+    idempotency.done_cache.clear()
+    assert claim_once("b#big#1") is False
+    assert reclaim_stale("b#big#1", stale_seconds=-1) is None
+
+
+def test_only_checkpointed_claims_are_reclaimed_without_extra_requests(table, monkeypatch):
+    monkeypatch.setattr(idempotency.settings, "CHECKPOINT_BYTES", 1024)
+    # No checkpoint: a path without heartbeats (compressed, ranges, columnar)
+    assert claim_many(["b#gz#1", "b#csv#1"]) == [True, True]
+    save_checkpoint("b#csv#1", Checkpoint(offset=10, header="id,amount\n"))
+    assert claim_many(["b#gz#1", "b#csv#1"]) == [False, False]
+
+    updates = []
+    real_update = table.update_item
+    monkeypatch.setattr(table, "update_item", lambda **kwargs: updates.append(kwargs) or real_update(**kwargs))
+
+    assert reclaim_stale("b#gz#1", stale_seconds=-1) is None
+    assert updates == []
+    assert reclaim_stale("b#csv#1", stale_seconds=-1).offset == 10
+    assert len(updates) == 1
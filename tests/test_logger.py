@@ -0,0 +1,74 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from app.config import settings
+from app.logger import configure_logging, flush_logs, get_logger, log_context
+
+
+@pytest.fixture
+def json_logs(monkeypatch, capsys):
+    def configure(log_async: bool):
+        monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+        monkeypatch.setattr(settings, "LOG_ASYNC", log_async)
+        configure_logging()
+
+    yield configure
+
+    monkeypatch.undo()
+    configure_logging()
+
+
+def read_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+
+
+def test_json_log_lines_carry_bound_context(json_logs, capsys):
+    json_logs(log_async=False)
+    log = get_logger("tests.json")
+
+    with log_context(request_id="req-1"):
+        with log_context(pk="b#k#1"):
+            log.info("Processed CSV | rows=%s", 3)
+        log.warning("after")
+
+    first, second = read_lines(capsys)
+    assert first["message"] == "Processed CSV | rows=3"
+    assert first["request_id"] == "req-1" and first["pk"] == "b#k#1"
+    assert second["level"] == "WARNING" and "pk" not in second
+
+
+def test_async_logging_writes_from_listener_thread(json_logs, capsys):
+    json_logs(log_async=True)
+    log = get_logger("tests.async")
+
+    def worker():
+        with log_context(pk="from-thread"):
+            log.info("in %s", "thread")
+
+    with log_context(request_id="req-2"):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log.exception("failed")
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    flush_logs()
+
+    lines = read_lines(capsys)
+    assert lines[0]["request_id"] == "req-2" and "ValueError: boom" in lines[0]["exception"]
+    assert lines[1] == {**lines[1], "message": "in thread", "pk": "from-thread"}
+
+
+def test_filtered_levels_are_never_formatted():
+    class Exploding:
+        def __str__(self):
+            raise AssertionError("formatted although DEBUG is disabled")
+
+    log = get_logger("tests.lazy")
+    assert not log.isEnabledFor(logging.DEBUG)
+
+    log.debug("row=%s", Exploding())
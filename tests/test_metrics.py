@@ -0,0 +1,65 @@
+import io
+import json
+
+from app import S3_processor, clients, idempotency
+from app.metrics import Metrics, add_metric, metrics_scope, timed
+
+
+def emf_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+
+def test_metrics_scope_emits_emf_on_stdout(capsys):
+    @timed("ClaimLatency")
+    def claim():
+        return True
+
+    with metrics_scope(pk="b#k#1"):
+        claim()
+        with timed("S3GetObjectLatency"):
+            pass
+        add_metric("BytesRead", 10, "Bytes")
+        add_metric("BytesRead", 5, "Bytes")
+
+    (line,) = emf_lines(capsys)
+    directive = line["_aws"]["CloudWatchMetrics"][0]
+    names = {m["Name"]: m["Unit"] for m in directive["Metrics"]}
+    assert names == {"ClaimLatency": "Milliseconds", "S3GetObjectLatency": "Milliseconds", "BytesRead": "Bytes"}
+    assert directive["Dimensions"] == [["Service"]]
+    assert line["BytesRead"] == 15
+    assert line["pk"] == "b#k#1"
+    assert isinstance(line["_aws"]["Timestamp"], int)
+
+
+def test_recording_outside_a_scope_is_a_noop(capsys):
+    add_metric("Orphan", 1)
+    with timed("Orphan"):
+        pass
+
+    assert emf_lines(capsys) == []
+
+
+def test_empty_metrics_are_not_emitted():
+    out = io.StringIO()
+    Metrics().emit(out)
+
+    assert out.getvalue() == ""
+
+
+def test_process_s3_object_emits_stage_metrics(monkeypatch, capsys):
+    class FakeS3:
+        def get_object(self, Bucket, Key):
+            return {"Body": io.BytesIO(b"id,amount\n1,10\n2,x\n3\n")}
+
+    monkeypatch.setitem(clients._clients, "s3", FakeS3())
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+
+    result = S3_processor.process_s3_object({"bucket": "b", "key": "k.csv"})
+
+    (line,) = emf_lines(capsys)
+    assert result["bad_rows"] == 2
+    assert line["BytesRead"] == 21
+    assert line["RowsProcessed"] == 3
+    assert line["BadRows"] == 2 and line["InvalidAmountRows"] == 1 and line["MissingAmountRows"] == 1
+    for stage in ("ClaimLatency", "S3GetObjectLatency", "S3ReadTime", "DecodeTime", "CsvParseTime", "MarkDoneLatency"):
+        assert stage in line
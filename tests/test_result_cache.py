@@ -0,0 +1,73 @@
+import io
+import json
+
+import pytest
+
+from app import S3_processor, clients, idempotency, result_cache
+from app.result_cache import cache_stats, clear_cache, get_result, put_result
+
+
+class CountingS3:
+    def __init__(self):
+        self.gets = 0
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {"Body": io.BytesIO(b"id,amount\n1,10\n2,15\n")}
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    fake = CountingS3()
+    monkeypatch.setitem(clients._clients, "s3", fake)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+    monkeypatch.setattr(result_cache.settings, "RESULT_CACHE_DIR", str(tmp_path / "results"))
+    clear_cache()
+    yield fake
+    clear_cache()
+
+
+def test_repeated_object_version_is_served_from_cache(s3):
+    info = {"bucket": "b", "key": "k.csv", "etag": "e1"}
+
+    first = S3_processor.process_s3_object(info)
+    second = S3_processor.process_s3_object(info)
+
+    assert s3.gets == 1
+    assert second == {**first, "cached": True}
+    assert cache_stats()["hits"] == 1
+
+    # Another version of the object, or no version at all: read again
+    S3_processor.process_s3_object({**info, "etag": "e2"})
+    S3_processor.process_s3_object({"bucket": "b", "key": "k.csv"})
+    S3_processor.process_s3_object({"bucket": "b", "key": "k.csv"})
+    assert s3.gets == 4
+
+
+def test_disk_tier_outlives_memory_and_expires(s3, monkeypatch):
+    put_result("b#k#e1", {"skipped": False, "rows": 2, "total_amount": 25})
+    result_cache.result_cache.clear()
+
+    assert get_result("b#k#e1")["total_amount"] == 25
+    assert cache_stats()["disk_hits"] == 1
+
+    result_cache.result_cache.clear()
+    path = result_cache._disk_path("b#k#e1")
+    entry = json.loads(path.read_text())
+    path.write_text(json.dumps({**entry, "expires_at": 0}))
+
+    assert get_result("b#k#e1") is None
+    assert not path.exists()
+
+
+def test_cache_is_bypassed_with_idempotency(s3, monkeypatch):
+    monkeypatch.setattr(S3_processor, "idempotency_enabled", lambda: True)
+    monkeypatch.setattr(S3_processor, "claim_once", lambda pk: True)
+    monkeypatch.setattr(S3_processor, "mark_done", lambda pk: None)
+    info = {"bucket": "b", "key": "k.csv", "etag": "e1"}
+
+    S3_processor.process_s3_object(info)
+    S3_processor.process_s3_object(info)
+
+    assert s3.gets == 2
+    assert cache_stats()["size"] == 0
@@ -0,0 +1,436 @@
+import gzip
+import io
+import json
+import re
+import tracemalloc
+
+import pytest
+
+from app import S3_processor, clients, idempotency
+from app.S3_processor import (
+    parse_s3_records,
+    process_s3_batch,
+    sum_csv_amount,
+    sum_csv_lines,
+    sum_csv_stream,
+)
+from app.streaming import iter_gunzip, iter_range_chunks, iter_text_lines
+from app.main import handler
+
+
+def s3_record(bucket: str, key: str, etag: str = "abc") -> dict:
+    return {
+        "eventSource": "aws:s3",
+        "s3": {"bucket": {"name": bucket}, "object": {"key": key, "eTag": etag}},
+    }
+
+
+def sqs_record(message_id: str, *records: dict) -> dict:
+    return {
+        "eventSource": "aws:sqs",
+        "messageId": message_id,
+        "body": json.dumps({"Records": list(records)}),
+    }
+
+
+def test_parse_s3_records_reads_every_record():
+    event = {"Records": [s3_record("b", "one.csv"), s3_record("b", "two.csv")]}
+
+    infos = parse_s3_records(event)
+
+    assert [i["key"] for i in infos] == ["one.csv", "two.csv"]
+    assert [i["item_id"] for i in infos] == ["b/one.csv", "b/two.csv"]
+
+
+def test_parse_s3_records_unwraps_sqs_and_sns():
+    sns_envelope = {"Type": "Notification", "Message": json.dumps({"Records": [s3_record("b", "c.csv")]})}
+    event = {
+        "Records": [
+            sqs_record("m1", s3_record("b", "a.csv"), s3_record("b", "b.csv")),
+            {"eventSource": "aws:sqs", "messageId": "m2", "body": json.dumps(sns_envelope)},
+        ]
+    }
+
+    infos = parse_s3_records(event)
+
+    assert [(i["key"], i["item_id"]) for i in infos] == [("a.csv", "m1"), ("b.csv", "m1"), ("c.csv", "m2")]
+
+
+def test_malformed_message_does_not_drop_the_rest_of_the_batch():
+    event = {
+        "Records": [
+            sqs_record("m1", s3_record("b", "a.csv")),
+            {"eventSource": "aws:sqs", "messageId": "m2", "body": "not json"},
+            sqs_record("m3", s3_record("b", "c.csv")),
+        ]
+    }
+
+    infos = parse_s3_records(event)
+
+    assert [(i["key"], i["item_id"]) for i in infos] == [("a.csv", "m1"), (None, "m2"), ("c.csv", "m3")]
+
+
+def test_process_s3_batch_reports_partial_failures(monkeypatch):
+    def fake_process(info, **kwargs):
+        if info["key"] == "bad.csv":
+            raise RuntimeError("boom")
+        return {"skipped": False, "rows": 1, "total_amount": 10}
+
+    monkeypatch.setattr(S3_processor, "process_s3_object", fake_process)
+    event = {
+        "Records": [
+            sqs_record("m1", s3_record("b", "ok.csv")),
+            sqs_record("m2", s3_record("b", "bad.csv")),
+            sqs_record("m3", s3_record("b", "ok2.csv")),
+        ]
+    }
+
+    batch = process_s3_batch(parse_s3_records(event), max_workers=3)
+
+    assert batch["batchItemFailures"] == [{"itemIdentifier": "m2"}]
+    assert [r["item_id"] for r in batch["results"]] == ["m1", "m2", "m3"]
+    assert batch["results"][1]["failed"] is True
+
+
+def test_handler_returns_batch_item_failures_for_sqs(monkeypatch):
+    def fake_process(info, **kwargs):
+        if info["key"] == "bad.csv":
+            raise RuntimeError("boom")
+        return {"skipped": False, "rows": 1, "total_amount": 10}
+
+    monkeypatch.setattr(S3_processor, "process_s3_object", fake_process)
+    event = {"Records": [sqs_record("m1", s3_record("b", "ok.csv")), sqs_record("m2", s3_record("b", "bad.csv"))]}
+
+    response = handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert response["batchItemFailures"] == [{"itemIdentifier": "m2"}]
+
+
+def test_handler_raises_for_direct_s3_failures(monkeypatch):
+    def fake_process(info, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(S3_processor, "process_s3_object", fake_process)
+
+    with pytest.raises(S3_processor.S3BatchError):
+        handler({"Records": [s3_record("b", "bad.csv")]}, None)
+
+
+class SyntheticBody:
+    """File-like body that generates `size` bytes of CSV without holding them"""
+
+    def __init__(self, size: int, row: bytes) -> None:
+        self.header = b"id,name,amount\n"
+        self.block = row * max(1, (1024 * 1024) // len(row))
+        # whole rows only, so the expected row count is exact
+        self.left = size - size % len(row)
+
+    def read(self, amt: int) -> bytes:
+        if self.header:
+            header, self.header = self.header, b""
+            return header
+        if self.left <= 0:
+            return b""
+        data = self.block[: min(amt, self.left)]
+        self.left -= len(data)
+        return data
+
+
+def test_iter_text_lines_reassembles_rows_split_across_chunks():
+    data = "id,name,amount\r\n1,Zoë,10\n2,\"multi\nline\",20\n3,Ñandú,x\n".encode("utf-8")
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+
+    lines = list(iter_text_lines(chunks))
+
+    assert "".join(lines) == data.decode("utf-8")
+    assert sum_csv_lines(lines) == sum_csv_amount(data.decode("utf-8")) == (30, 3)
+
+
+def test_sum_csv_stream_matches_in_memory_result():
+    content = "ID, Amount ,name\n1,10,a\n2,,b\n3,5\n4,abc,d\n5,7,e"
+
+    assert sum_csv_stream(io.BytesIO(content.encode("utf-8")), chunk_size=1024) == sum_csv_amount(content)
+
+
+def test_sum_csv_stream_memory_is_bounded_on_1gb_stream():
+    row = b"1," + b"x" * 16000 + b",7\n"
+    body = SyntheticBody(1024 ** 3, row)
+
+    tracemalloc.start()
+    try:
+        total, rows = sum_csv_stream(body, chunk_size=1024 * 1024)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert rows == 1024 ** 3 // len(row)
+    assert total == 7 * rows
+    # ~ one chunk + decoded block; nowhere near the 1 GB object
+    assert peak < 32 * 1024 * 1024
+
+
+def test_process_s3_object_streams_body(monkeypatch):
+    class FakeS3:
+        def get_object(self, Bucket, Key):
+            return {"Body": io.BytesIO(b"id,amount\n1,10\n2,15\n")}
+
+    monkeypatch.setitem(clients._clients, "s3", FakeS3())
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+
+    result = S3_processor.process_s3_object({"bucket": "b", "key": "k.csv"})
+
+    assert result["rows"] == 2
+    assert result["total_amount"] == 25
+
+
+@pytest.fixture
+def s3_bucket(monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="bucket")
+        monkeypatch.setitem(clients._clients, "s3", client)
+        monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "")
+        yield client
+
+
+def test_iter_range_chunks_yields_every_line_once():
+    data = b"id,amount\n" + b"".join(b"%d,%d\n" % (i, i) for i in range(200))
+    data_start = data.index(b"\n") + 1
+
+    for parts in range(1, 9):
+        span = -(-(len(data) - data_start) // parts)
+        out = b""
+        for start in range(data_start, len(data), span):
+            src = data[start - 1:]
+            chunks = [src[i:i + 7] for i in range(0, len(src), 7)]
+            out += b"".join(iter_range_chunks(chunks, start, min(start + span, len(data))))
+        assert out == data[data_start:]
+
+
+def test_process_s3_object_by_ranges_matches_single_stream(s3_bucket, monkeypatch):
+    content = "id,name,amount\n" + "".join(f"{i},n{i},{i if i % 13 else 'x'}\n" for i in range(5000))
+    s3_bucket.put_object(Bucket="bucket", Key="big.csv", Body=content.encode("utf-8"))
+    monkeypatch.setattr(S3_processor.settings, "S3_RANGE_MIN_SIZE", 1)
+
+    ranged = S3_processor.process_s3_object({"bucket": "bucket", "key": "big.csv"}, range_parts=4)
+    single = S3_processor.process_s3_object({"bucket": "bucket", "key": "big.csv"}, range_parts=0)
+
+    assert (ranged["total_amount"], ranged["rows"]) == sum_csv_amount(content)
+    assert (single["total_amount"], single["rows"]) == sum_csv_amount(content)
+
+
+def test_ranged_gets_are_bounded_and_follow_long_lines(s3_bucket, monkeypatch):
+    # Lines much longer than the slack: the last line of a range takes follow-up GETs
+    content = "id,note,amount\n" + "".join(f"{i},{'n' * (i % 97)},{i}\n" for i in range(400))
+    s3_bucket.put_object(Bucket="bucket", Key="long.csv", Body=content.encode())
+    monkeypatch.setattr(S3_processor, "RANGE_SLACK_BYTES", 16)
+
+    ranges = []
+    real_get = s3_bucket.get_object
+
+    def spy_get(**kwargs):
+        ranges.append(kwargs["Range"])
+        return real_get(**kwargs)
+
+    monkeypatch.setattr(s3_bucket, "get_object", spy_get)
+
+    assert S3_processor.sum_csv_ranges("bucket", "long.csv", len(content), 5) == sum_csv_amount(content)
+    assert ranges[0] == "bytes=0-15"
+    assert all(not r.endswith("-") for r in ranges)
+
+
+def test_sum_csv_ranges_header_only(s3_bucket):
+    s3_bucket.put_object(Bucket="bucket", Key="empty.csv", Body=b"id,amount\n")
+
+    assert S3_processor.sum_csv_ranges("bucket", "empty.csv", 10, 4) == (0, 0)
+
+
+@pytest.fixture
+def idempotency_table(s3_bucket, monkeypatch):
+    import boto3
+
+    dynamodb = boto3.client("dynamodb", region_name="us-east-1")
+    dynamodb.create_table(
+        TableName="idempotency",
+        KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setitem(clients._clients, "dynamodb", dynamodb)
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TABLE", "idempotency")
+    idempotency.done_cache.clear()
+    idempotency.resumable_claims.clear()
+    yield dynamodb
+    idempotency.done_cache.clear()
+    idempotency.resumable_claims.clear()
+
+
+def test_failed_record_is_reprocessed_when_sqs_redelivers_it(s3_bucket, idempotency_table, monkeypatch):
+    s3_bucket.put_object(Bucket="bucket", Key="ok.csv", Body=b"id,amount\n1,10\n")
+    s3_bucket.put_object(Bucket="bucket", Key="bad.csv", Body=b"id,amount\n1,5\n")
+    event = {"Records": [sqs_record("m1", s3_record("bucket", "ok.csv")), sqs_record("m2", s3_record("bucket", "bad.csv"))]}
+
+    real_aggregate = S3_processor._aggregate_s3_object
+
+    def flaky_aggregate(bucket, key, *args, **kwargs):
+        if key == "bad.csv":
+            raise RuntimeError("S3 read reset")
+        return real_aggregate(bucket, key, *args, **kwargs)
+
+    monkeypatch.setattr(S3_processor, "_aggregate_s3_object", flaky_aggregate)
+    assert handler(event, None)["batchItemFailures"] == [{"itemIdentifier": "m2"}]
+
+    # SQS redelivers only m2; the claim was released, so it's not a duplicate
+    monkeypatch.setattr(S3_processor, "_aggregate_s3_object", real_aggregate)
+    response = handler({"Records": [event["Records"][1]]}, None)
+
+    assert response["batchItemFailures"] == []
+    assert response["results"][0]["skipped"] is False
+    assert response["results"][0]["total_amount"] == 5
+    item = idempotency_table.get_item(TableName="idempotency", Key={"pk": {"S": "bucket#bad.csv#abc"}})["Item"]
+    assert item["status"]["S"] == "DONE"
+
+
+def test_batch_keeps_claims_of_groups_committed_before_a_failure(s3_bucket, idempotency_table, monkeypatch):
+    from botocore.exceptions import ClientError
+
+    for i in range(150):
+        s3_bucket.put_object(Bucket="bucket", Key=f"{i}.csv", Body=b"id,amount\n1,2\n")
+    event = {"Records": [sqs_record(f"m{i}", s3_record("bucket", f"{i}.csv")) for i in range(150)]}
+
+    calls = []
+    real_transact = idempotency_table.transact_write_items
+
+    def throttle_second_group(**kwargs):
+        calls.append(len(kwargs["TransactItems"]))
+        if len(calls) == 2:
+            raise ClientError({"Error": {"Code": "ThrottlingException"}}, "TransactWriteItems")
+        return real_transact(**kwargs)
+
+    monkeypatch.setattr(idempotency_table, "transact_write_items", throttle_second_group)
+    response = handler(event, None)
+
+    # The first 100 claims committed: they are ours, not duplicates
+    assert calls[:2] == [100, 50]
+    assert response["batchItemFailures"] == []
+    assert [r["skipped"] for r in response["results"]] == [False] * 150
+    assert sum(r["total_amount"] for r in response["results"]) == 300
+
+
+@pytest.mark.parametrize("overwritten", [False, True])
+def test_process_s3_object_resumes_stale_claim_from_checkpoint(s3_bucket, idempotency_table, monkeypatch, overwritten):
+    dynamodb = idempotency_table
+    monkeypatch.setattr(S3_processor.settings, "S3_CHUNK_SIZE", 1024)
+    monkeypatch.setattr(S3_processor.settings, "CHECKPOINT_BYTES", 4096)
+
+    content = "id,amount\n" + "".join(f"{i},{i}\n" for i in range(5000))
+    etag = s3_bucket.put_object(Bucket="bucket", Key="big.csv", Body=content.encode("utf-8"))["ETag"].strip('"')
+    info = {"bucket": "bucket", "key": "big.csv", "etag": etag}
+
+    real_save = S3_processor.save_checkpoint
+
+    class TaskTimedOut(BaseException):
+        """Lambda kills the process: no except/finally of the handler runs"""
+
+    def save_then_time_out(pk, checkpoint):
+        real_save(pk, checkpoint)
+        raise TaskTimedOut()
+
+    monkeypatch.setattr(S3_processor, "save_checkpoint", save_then_time_out)
+    with pytest.raises(TaskTimedOut):
+        S3_processor.process_s3_object(info)
+
+    # The claim still has a fresh heartbeat: another invocation may own it
+    assert S3_processor.process_s3_object(info)["reason"] == "duplicate"
+
+    if overwritten:
+        # The checkpoint offset and partial totals belong to the old version
+        content = "id,amount\n" + "".join(f"{i},1\n" for i in range(3000))
+        s3_bucket.put_object(Bucket="bucket", Key="big.csv", Body=content.encode("utf-8"))
+
+    ranges = []
+    real_get = s3_bucket.get_object
+
+    def spy_get(**kwargs):
+        ranges.append(kwargs.get("Range"))
+        return real_get(**kwargs)
+
+    monkeypatch.setattr(s3_bucket, "get_object", spy_get)
+    monkeypatch.setattr(S3_processor, "save_checkpoint", real_save)
+    monkeypatch.setattr(S3_processor.settings, "CHECKPOINT_STALE_SECONDS", -1)
+
+    result = S3_processor.process_s3_object(info)
+
+    assert result["skipped"] is False
+    assert (result["total_amount"], result["rows"]) == sum_csv_amount(content)
+    assert ranges[0] is not None and ranges[0] != "bytes=0-"
+    # A changed object fails the IfMatch of the resume and is read again from byte 0
+    assert ranges[1:] == ([None] if overwritten else [])
+    item = dynamodb.get_item(TableName="idempotency", Key={"pk": {"S": result["pk"]}})["Item"]
+    assert item["status"]["S"] == "DONE"
+    assert item["attempt"]["N"] == "1"
+
+
+def test_checkpoints_never_split_quoted_fields(s3_bucket, idempotency_table, monkeypatch):
+    monkeypatch.setattr(S3_processor.settings, "S3_CHUNK_SIZE", 100)
+    monkeypatch.setattr(S3_processor.settings, "CHECKPOINT_BYTES", 2048)
+    content = "id,note,amount\n" + "".join(f'{i},"line one\nline ""two""",{i}\n' for i in range(500))
+    s3_bucket.put_object(Bucket="bucket", Key="notes.csv", Body=content.encode("utf-8"))
+
+    offsets = []
+    real_save = S3_processor.save_checkpoint
+
+    def spy_save(pk, checkpoint):
+        offsets.append(checkpoint.offset)
+        real_save(pk, checkpoint)
+
+    monkeypatch.setattr(S3_processor, "save_checkpoint", spy_save)
+    result = S3_processor.process_s3_object({"bucket": "bucket", "key": "notes.csv", "etag": "e1"})
+
+    assert (result["total_amount"], result["rows"], result["bad_rows"]) == (124750, 500, 0)
+    # Every checkpoint is a record boundary: a resume would start on a new row
+    assert offsets and all(re.match(r'\d+,"line one\n', content[offset:]) for offset in offsets)
+
+
+def test_sum_csv_stream_inflates_concatenated_gzip_members():
+    content = "id,amount\n" + "".join(f"{i},{i}\n" for i in range(2000)) + "x,bad\n"
+    raw = content.encode("utf-8")
+    body = gzip.compress(raw[:5000]) + gzip.compress(raw[5000:])
+
+    assert sum_csv_stream(io.BytesIO(body), chunk_size=1024) == sum_csv_amount(content)
+
+    with pytest.raises(ValueError, match="Truncated"):
+        sum_csv_stream(io.BytesIO(gzip.compress(raw)[:-20]), chunk_size=1024)
+
+
+def test_iter_gunzip_output_is_bounded_by_chunk_size():
+    # ~50 KB of gzip that inflates to 64 MB
+    data = gzip.compress(b"0" * (64 * 1024 * 1024))
+
+    sizes = [len(chunk) for chunk in iter_gunzip([data], chunk_size=1024 * 1024)]
+
+    assert max(sizes) <= 1024 * 1024
+    assert sum(sizes) == 64 * 1024 * 1024
+
+
+def test_sum_csv_stream_inflates_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    content = "id,amount\n1,10\n2,20\n"
+
+    body = zstandard.ZstdCompressor().compress(content.encode("utf-8"))
+
+    assert sum_csv_stream(io.BytesIO(body), chunk_size=1024) == (30, 2)
+
+
+def test_process_s3_object_sniffs_compressed_ndjson(s3_bucket):
+    lines = [{"id": 1, "amount": 10}, {"id": 2, "amount": "5"}, {"id": 3}, {"id": 4, "amount": 1.5}]
+    body = gzip.compress("".join(json.dumps(line) + "\n" for line in lines).encode("utf-8"))
+    s3_bucket.put_object(Bucket="bucket", Key="orders.ndjson.gz", Body=body, ContentEncoding="gzip")
+
+    result = S3_processor.process_s3_object({"bucket": "bucket", "key": "orders.ndjson.gz", "etag": "e"})
+
+    assert (result["rows"], result["total_amount"], result["bad_rows"]) == (4, 15, 2)